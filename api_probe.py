@@ -0,0 +1,198 @@
+"""
+Browserless probe that replays the logical steps of the page_perf_timer user
+flow directly against the Galaxy API. It does not use Selenium, so it is cheap
+enough to be run every few seconds, and its results can be compared with the
+browser timings through the mode=api tag.
+"""
+import sys
+from urllib.parse import quote
+
+import requests
+
+import galaxy_api
+from output_sinks import add_sink_arguments
+from probe_base import ProbeBase, create_probe_parser, probe_main, run_probe
+from timing import clock_action
+
+BWA_TOOL_ID_PREFIX = "toolshed.g2.bx.psu.edu/repos/devteam/bwa/bwa/0.7"
+
+# Datasets to select for each labelled workflow input, matching the choices
+# made on the workflow run form by the browser flow. Inputs that are not
+# listed here get the most recent dataset in the history, as the form does.
+WORKFLOW_INPUTS = {
+    "Selenium_test_1": {"1": "Subsample of reads from human exome R1"},
+    "Selenium_test_2": {"1": "Subsample of reads from human exome R1"},
+    "Selenium_test_3": {
+        "Forward Reads": "ERR019289_1.fastq.gz",
+        "Reverse Reads": "ERR019289_2.fastq.gz",
+    },
+    "Selenium_test_4": {"ARTIC primers to amplicon assignments": "ARTIC_SARS_CoV-2_amplicon_info_v3.tsv"},
+    "Selenium_test_6": {"ARTIC primers to amplicon assignments": "ARTIC_SARS_CoV-2_amplicon_info_v3.tsv"},
+}
+
+
+class ApiProbe(ProbeBase):
+    mode = "api"
+
+    def __init__(
+        self, server, username, password, end_step=None, run_id=None, workflow_name=None, category=None,
+        session=None, sink=None, span_tree=False,
+    ):
+        super().__init__(server, username, password, end_step, run_id, category, session, sink, span_tree)
+        self.workflow_name = workflow_name
+        self.tool_id = None
+        self.published_history_id = None
+        self.history_id = None
+        self.workflow_id = None
+
+    @clock_action("login_page_load")
+    def load_galaxy_login(self):
+        # The login page is rendered from the server configuration
+        self.get("/api/configuration")
+
+    @clock_action("home_page_load")
+    def login_to_galaxy_homepage(self):
+        with self.spans.span("submit_login"):
+            # Drop the key from a previous run, so that login is measured every time
+            self.session.headers.pop("x-api-key", None)
+            galaxy_api.login(self.session, self.server, self.username, self.password)
+            self.get("/api/users/current")
+        with self.spans.span("load_tool_panel"):
+            try:
+                self.get("/api/tool_panels/default")
+            except requests.HTTPError:
+                # Galaxy releases before 23.1
+                self.get("/api/tools", in_panel=True)
+
+    @clock_action("tool_search_load")
+    def search_for_tool(self):
+        tool_ids = self.get("/api/tools", q="bwa")
+        self.tool_id = next((tool_id for tool_id in tool_ids if tool_id.startswith(BWA_TOOL_ID_PREFIX)), None)
+        if not self.tool_id:
+            raise Exception(f"No tool starting with {BWA_TOOL_ID_PREFIX} found in search results for bwa")
+
+    @clock_action("tool_form_load")
+    def load_tool_form(self):
+        self.get(f"/api/tools/{quote(self.tool_id, safe='')}/build")
+
+    @clock_action("published_histories_page_load")
+    def load_published_histories(self):
+        histories = self.get("/api/histories/published")
+        history_name = f"{self.workflow_name.lower()}_input_data"
+        for history in histories:
+            if history["name"].lower() == history_name:
+                self.published_history_id = history["id"]
+        if not self.published_history_id:
+            raise Exception(f"No published history named {history_name} found")
+
+    @clock_action("import_published_history")
+    def import_published_history(self):
+        history = self.post(
+            "/api/histories",
+            {"history_id": self.published_history_id, "name": f"{self.workflow_name}_Input_data_{self.run_id}"},
+        )
+        self.history_id = history["id"]
+
+    @clock_action("workflow_list_page_load")
+    def load_workflow_list(self):
+        workflows = self.get("/api/workflows", show_published=True)
+        self.workflow_id = next(
+            (workflow["id"] for workflow in workflows if workflow["name"].lower() == self.workflow_name.lower()),
+            None,
+        )
+        if not self.workflow_id:
+            raise Exception(f"No published workflow named {self.workflow_name} found")
+
+    @clock_action("workflow_run_page_load")
+    def load_workflow_run_form(self):
+        self.get(f"/api/workflows/{self.workflow_id}/download", style="run", history_id=self.history_id)
+
+    def workflow_inputs(self):
+        """
+        Map each workflow input step, by step id, to a dataset in the
+        imported history
+        """
+        workflow = self.get(f"/api/workflows/{self.workflow_id}")
+        contents = self.get(
+            f"/api/histories/{self.history_id}/contents", v="dev", keys="id,name,deleted,visible"
+        )
+        datasets = [item for item in contents if not item["deleted"] and item["visible"]]
+        by_label = WORKFLOW_INPUTS.get(self.workflow_name, {})
+        inputs = {}
+        # inputs are keyed by step id
+        for step_id, step_input in workflow["inputs"].items():
+            dataset_name = by_label.get(step_input.get("label"))
+            matches = [item for item in datasets if dataset_name is None or item["name"] == dataset_name]
+            if not matches:
+                raise Exception(f"No dataset found for workflow input: {step_input.get('label')}")
+            # history contents are listed oldest first
+            inputs[step_id] = {"src": "hda", "id": matches[-1]["id"]}
+        return inputs
+
+    @clock_action("workflow_invoke")
+    def invoke_workflow(self):
+        self.post(
+            f"/api/workflows/{self.workflow_id}/invocations",
+            {"history_id": self.history_id, "inputs": self.workflow_inputs(), "inputs_by": "step_id"},
+        )
+
+    def run_test_sequence(self):
+        self.load_galaxy_login()
+        self.login_to_galaxy_homepage()
+        self.search_for_tool()
+        self.load_tool_form()
+        self.load_published_histories()
+        self.import_published_history()
+        self.load_workflow_list()
+        self.load_workflow_run_form()
+        self.invoke_workflow()
+
+    def line_tags(self, action):
+        return dict(super().line_tags(action), end_step=self.end_step, workflow_name=self.workflow_name)
+
+
+def run_api_probe(args, sink):
+    """
+    Run the API flow once, or every args.interval seconds in daemon mode
+    """
+    run_probe(
+        args,
+        lambda run_id, session: ApiProbe(
+            args.server,
+            args.username,
+            args.password,
+            args.end_step,
+            run_id,
+            args.workflow_name,
+            args.category,
+            session=session,
+            sink=sink,
+            span_tree=args.span_tree,
+        ),
+    )
+
+
+def create_parser():
+    parser = create_probe_parser(
+        "Measure time taken for the API requests behind a typical user flow in Galaxy, without a browser."
+    )
+    parser.add_argument(
+        "--end_step",
+        default="tool_form_load",
+        help="Stop performance timer at a specific step",
+    )
+    parser.add_argument(
+        "--workflow_name",
+        default="Selenium_test_1",
+        help="The name of the workflow to run. Must be Selenium_test_1 through 4",
+    )
+    add_sink_arguments(parser)
+    return parser
+
+
+def main():
+    return probe_main(create_parser(), run_api_probe)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1703 @@
+"""
+The browser side of the timer: drives Firefox through the user flow and the
+browser benchmarks, timing each step. It is kept apart from the command line
+in page_perf_timer.py, so that the API only modes never import Selenium.
+"""
+import concurrent.futures
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlparse
+
+import galaxy_api
+from history_scaling import HistoryBuilder, ScalingResults
+from invocation_monitor import InvocationMonitor
+from latency_histogram import LatencyHistogram
+from line_protocol import format_line, format_spans, format_summaries
+from mock_galaxy import MockGalaxy
+from network_shaper import NetworkShaper, get_network_profile
+from output_sinks import StepWriter
+from ranged_download import RangedDownloader
+from session_cache import SessionCache
+from timing import EndStepReached, Span, SpanTimer, clock_action
+from tool_search_sweep import SweepResults, read_tool_queries, search_tools_api
+from tus_upload import SeededData, TusUploader, fetch_payload, wait_for_upload_job
+
+import requests
+# Generated by Selenium IDE
+from selenium import webdriver
+from selenium.common.exceptions import (
+    JavascriptException,
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.wait import WebDriverWait
+
+
+class SeleniumCustomWait(object):
+    """
+    Example usage:
+
+    with SeleniumCustomWait(driver, 0):
+        driver.find_element(By.ID, 'element-that-might-not-be-there')
+    """
+
+    def __init__(self, driver, new_wait=0):
+        self.driver = driver
+        self.original_wait = driver.timeouts.implicit_wait
+        self.new_wait = new_wait
+
+    def __enter__(self):
+        self.driver.implicitly_wait(self.new_wait)
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.driver.implicitly_wait(self.original_wait)
+
+
+# Number of slowest API requests to report per step
+SLOW_REQUEST_COUNT = 5
+
+# Installed in every document to record long tasks on the main thread, as
+# [start, duration] in ms. Browsers without the Long Tasks API (Firefox)
+# get an estimate instead, from how late a frequent timer fires.
+CLIENT_PROFILER_JS = """() => {
+    if (window.__pagePerfTimer) {
+        return;
+    }
+    const profiler = window.__pagePerfTimer = {tasks: []};
+    const record = (start, duration) => {
+        if (profiler.tasks.length >= 10000) {
+            profiler.tasks.shift();
+        }
+        profiler.tasks.push([start, duration]);
+    };
+    if (window.PerformanceObserver && (PerformanceObserver.supportedEntryTypes || []).includes('longtask')) {
+        new PerformanceObserver(list => {
+            for (const entry of list.getEntries()) {
+                record(entry.startTime, entry.duration);
+            }
+        }).observe({type: 'longtask', buffered: true});
+    } else {
+        const interval = 16;
+        let last = performance.now();
+        const tick = () => {
+            const now = performance.now();
+            const blocked = now - last - interval;
+            if (blocked >= 50) {
+                record(last + interval, blocked);
+            }
+            last = now;
+            setTimeout(tick, interval);
+        };
+        setTimeout(tick, interval);
+    }
+}"""
+
+# Returns the current document's time origin and time, so that entries
+# recorded during a step can be told apart from earlier ones, along with the
+# heap size and DOM node count at the start of the step
+BROWSER_STEP_START_JS = (
+    f"({CLIENT_PROFILER_JS})();"
+    + """
+performance.setResourceTimingBufferSize(1000);
+const heap = performance.memory ? performance.memory.usedJSHeapSize : null;
+return [performance.timeOrigin, performance.now(), heap, document.getElementsByTagName('*').length];
+"""
+)
+
+# Collects navigation, paint and resource timings recorded since the step
+# started. If the step navigated to a new document, everything in the new
+# document is included. All times are returned in seconds.
+BROWSER_STEP_END_JS = """
+const [startOrigin, startNow, startHeap, startDomNodes, slowCount] = arguments;
+const navigated = performance.timeOrigin !== startOrigin;
+const since = navigated ? 0 : startNow;
+const result = {};
+const nav = performance.getEntriesByType('navigation')[0];
+if (navigated && nav) {
+    result.ttfb = nav.responseStart / 1000;
+    result.dom_content_loaded = nav.domContentLoadedEventEnd / 1000;
+    result.load = nav.loadEventEnd / 1000;
+}
+for (const paint of performance.getEntriesByType('paint')) {
+    if (paint.name === 'first-contentful-paint' && paint.startTime >= since) {
+        result.fcp = (paint.startTime - since) / 1000;
+    }
+}
+try {
+    const observer = new PerformanceObserver(() => {});
+    observer.observe({type: 'largest-contentful-paint', buffered: true});
+    const lcp = observer.takeRecords().filter(e => e.startTime >= since).pop();
+    observer.disconnect();
+    if (lcp) {
+        result.lcp = (lcp.startTime - since) / 1000;
+    }
+} catch (e) {
+    // largest-contentful-paint is not supported by this browser
+}
+const resources = performance.getEntriesByType('resource').filter(e => e.startTime >= since);
+result.resource_count = resources.length;
+result.transfer_size = resources.reduce((total, e) => total + (e.transferSize || 0), 0);
+// served entirely from the browser cache, without a request
+const cached = resources.filter(e => e.transferSize === 0 && e.encodedBodySize > 0);
+result.cached_count = cached.length;
+result.cached_size = cached.reduce((total, e) => total + e.encodedBodySize, 0);
+result.slow_requests = resources
+    .filter(e => e.initiatorType === 'xmlhttprequest' || e.initiatorType === 'fetch')
+    .sort((a, b) => b.duration - a.duration)
+    .slice(0, slowCount)
+    .map(e => ({url: e.name, duration: e.duration / 1000, ttfb: (e.responseStart - e.startTime) / 1000}));
+const profiler = window.__pagePerfTimer;
+if (profiler) {
+    const tasks = profiler.tasks.filter(([start]) => start >= since);
+    result.long_tasks = tasks.length;
+    result.total_blocking_time = tasks.reduce((total, [, duration]) => total + Math.max(0, duration - 50), 0) / 1000;
+    result.longest_task = tasks.reduce((longest, [, duration]) => Math.max(longest, duration), 0) / 1000;
+}
+// only exposed by Chromium based browsers
+if (performance.memory) {
+    result.heap_used = performance.memory.usedJSHeapSize;
+    if (startHeap !== null) {
+        result.heap_delta = result.heap_used - startHeap;
+    }
+}
+result.dom_nodes = document.getElementsByTagName('*').length;
+if (!navigated) {
+    result.dom_nodes_delta = result.dom_nodes - startDomNodes;
+}
+return result;
+"""
+
+# Resolves as soon as any of the given locators matches (or, if present is
+# false, the first locator stops matching a visible element), using a
+# MutationObserver instead of polling. Returns the index of the matching
+# locator and the in-page unix time in ms at which the match happened, or
+# null if nothing matched within timeoutMs.
+WAIT_FOR_ELEMENT_JS = """
+const [locators, present, timeoutMs, done] = arguments;
+function find(by, selector) {
+    if (by === 'xpath') {
+        return document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } else if (by === 'id') {
+        return document.getElementById(selector);
+    } else if (by === 'name') {
+        return document.getElementsByName(selector)[0];
+    }
+    return document.querySelector(selector);
+}
+function isVisible(element) {
+    return !!(element.offsetWidth || element.offsetHeight || element.getClientRects().length);
+}
+function matchIndex() {
+    if (!present) {
+        const element = find(...locators[0]);
+        return (!element || !isVisible(element)) ? 0 : -1;
+    }
+    return locators.findIndex(([by, selector]) => find(by, selector));
+}
+let timer = null;
+const observer = new MutationObserver(() => {
+    const index = matchIndex();
+    if (index >= 0) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done([index, performance.timeOrigin + performance.now()]);
+    }
+});
+const index = matchIndex();
+if (index >= 0) {
+    done([index, performance.timeOrigin + performance.now()]);
+} else {
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    timer = setTimeout(() => { observer.disconnect(); done(null); }, timeoutMs);
+}
+"""
+
+# Maximum seconds for a single in-page wait. Longer waits are split up, so
+# that no single WebDriver call outlives its http timeout.
+EVENT_WAIT_SLICE = 60
+
+# Failed in-page waits in a row on the same document after which the error
+# is raised, as it is a script error rather than the page being replaced
+EVENT_WAIT_MAX_ERRORS = 3
+
+# Workflows whose user flow still needs the browser once the workflow has run
+BROWSER_STEPS_AFTER_WORKFLOW = ("Selenium_test_5", "Selenium_test_7")
+
+# Scrolls the history panel down until the item matching the selector has
+# rendered, and returns the time taken in ms, or null if it never did
+HISTORY_SCROLL_JS = """
+const [selector, timeoutMs, done] = arguments;
+const panel = document.getElementById('current-history-panel');
+const start = performance.now();
+let scroller = null;
+function findScroller() {
+    if (!scroller || !scroller.isConnected) {
+        scroller = Array.from(panel.querySelectorAll('*')).find(element =>
+            element.scrollHeight > element.clientHeight && ['auto', 'scroll'].includes(getComputedStyle(element).overflowY));
+    }
+    return scroller;
+}
+function step() {
+    if (panel.querySelector(selector)) {
+        done(performance.now() - start);
+    } else if (performance.now() - start > timeoutMs) {
+        done(null);
+    } else {
+        const element = findScroller();
+        if (element) {
+            element.scrollTop = element.scrollHeight;
+        }
+        requestAnimationFrame(step);
+    }
+}
+if (panel) {
+    step();
+} else {
+    done(null);
+}
+"""
+
+# Timings of the request for the tool form's model, from the tool form page
+TOOL_FORM_BUILD_JS = """
+const build = performance.getEntriesByType('resource')
+    .filter(e => new URL(e.name).pathname.endsWith('/build'))
+    .pop();
+if (!build) {
+    return null;
+}
+return {
+    build_time: build.duration / 1000,
+    build_ttfb: (build.responseStart - build.startTime) / 1000,
+    build_bytes: build.transferSize,
+};
+"""
+
+# Seconds to wait for each tool form in a tool form benchmark
+TOOL_FORM_TIMEOUT = 120
+
+# Shown instead of the tool form if it fails to build
+TOOL_FORM_ERROR = (By.CSS_SELECTOR, ".alert-danger")
+
+# Seconds to wait for each query's expected tool in a tool search sweep
+TOOL_SEARCH_TIMEOUT = 30
+
+# Seconds to wait for each history to render, or be scrolled through, in a history scaling benchmark
+HISTORY_PANEL_TIMEOUT = 600
+
+# The last step covered by the mock Galaxy used for self benchmarks
+SELF_BENCHMARK_END_STEP = "workflow_run_page_load"
+
+# Actions recorded for browser startup rather than for the user flow itself
+DRIVER_ACTIONS = ("driver_startup", "driver_reset")
+
+
+def create_driver(proxy_address=None):
+    """Start web driver"""
+    options = webdriver.FirefoxOptions()
+    if os.environ.get("SELENIUM_HEADLESS"):
+        options.add_argument("--no-sandbox")
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+    # Use full resolution timestamps for in-page timings
+    options.set_preference("privacy.reduceTimerPrecision", False)
+    if proxy_address:
+        host, port = proxy_address
+        options.set_preference("network.proxy.type", 1)
+        for scheme in ("http", "ssl"):
+            options.set_preference(f"network.proxy.{scheme}", host)
+            options.set_preference(f"network.proxy.{scheme}_port", port)
+        options.set_preference("network.proxy.no_proxies_on", "")
+        # also send requests for local servers through the proxy
+        options.set_preference("network.proxy.allow_hijacking_localhost", True)
+    # Needed to install the client profiler in every document as it starts
+    options.enable_bidi = True
+    driver = webdriver.Firefox(options=options)
+    driver.implicitly_wait(180)
+    try:
+        driver.script.add_preload_script(CLIENT_PROFILER_JS)
+    except WebDriverException as e:
+        # The profiler is then only installed at the start of each step
+        print(f"Could not install client profiler in new documents: {e}", file=sys.stderr)
+    return driver
+
+
+class EventWait(object):
+    """
+    Waits for elements by injecting a MutationObserver into the page, which
+    fires at the moment the DOM changes, instead of polling from WebDriver.
+    The in-page time at which the last wait was satisfied is kept in
+    last_matched, as unix time in ns.
+
+    Example usage:
+
+    EventWait(driver).until([(By.ID, "execute")])
+    """
+
+    def __init__(self, driver, timeout=180):
+        self.driver = driver
+        self.timeout = timeout
+        self.last_matched = None
+
+    def until(self, locators, present=True, timeout=None):
+        """
+        Wait until any of the locators is present, or until the first locator
+        is no longer visible if present is false. Returns the index of the
+        matching locator.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        failed_document = None
+        failures = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(f"Timed out waiting for {locators}")
+            wait_slice = min(remaining, EVENT_WAIT_SLICE)
+            self.driver.set_script_timeout(wait_slice + 30)
+            try:
+                result = self.driver.execute_async_script(
+                    WAIT_FOR_ELEMENT_JS, [list(locator) for locator in locators], present, wait_slice * 1000
+                )
+            except (JavascriptException, TimeoutException):
+                document = self.document_origin()
+                if document is None or document != failed_document:
+                    # The document was replaced while waiting, so wait in the new one
+                    failed_document = document
+                    failures = 1
+                else:
+                    failures += 1
+                    if failures >= EVENT_WAIT_MAX_ERRORS:
+                        raise
+                time.sleep(0.05)
+                continue
+            if result:
+                index, matched_ms = result
+                self.last_matched = int(matched_ms * 1e6)
+                return index
+
+    def document_origin(self):
+        """
+        The current document's time origin, which tells documents apart, or
+        None while there is no document to ask
+        """
+        try:
+            return self.driver.execute_script("return performance.timeOrigin;")
+        except (JavascriptException, TimeoutException):
+            return None
+
+
+class Browser(object):
+    """
+    A started web driver, along with how long it took to start. A browser
+    can be reused across runs by resetting it in between. Given a network
+    profile, the browser's traffic goes through its own shaping proxy, as
+    if it were on its own slow link.
+    """
+
+    def __init__(self, network_profile=None):
+        self.shaper = None
+        if network_profile:
+            self.shaper = NetworkShaper(network_profile)
+            self.shaper.start()
+        span = Span("driver_startup")
+        span.start()
+        self.driver = create_driver(self.shaper.address if self.shaper else None)
+        span.end()
+        self.pending_spans = [span]
+
+    def take_spans(self):
+        """
+        Return driver startup or reset spans not yet reported by a run
+        """
+        spans, self.pending_spans = self.pending_spans, []
+        return spans
+
+    def reset(self, origins):
+        """
+        Close extra tabs and clear cookies and storage for each of the given
+        origins, so that the next run starts with a logged out session.
+        """
+        span = Span("driver_reset")
+        span.start()
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        for origin in origins:
+            self.driver.get(origin)
+            self.driver.delete_all_cookies()
+            self.driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear();"
+                "if (window.indexedDB && indexedDB.databases) {"
+                "  indexedDB.databases().then(dbs => dbs.forEach(db => indexedDB.deleteDatabase(db.name)));"
+                "}"
+            )
+        self.driver.get("about:blank")
+        span.end()
+        self.pending_spans.append(span)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        finally:
+            if self.shaper:
+                self.shaper.stop()
+
+
+class BrowserPool(object):
+    """
+    A pool of pre-started browsers. Each run acquires a browser, and
+    releases it once done, at which point it is reset for the next run.
+    A browser that cannot be reset is replaced with a freshly started one.
+    """
+
+    def __init__(self, size, network_profile=None):
+        self.network_profile = network_profile
+        self.browsers = queue.Queue()
+        for _ in range(size):
+            self.browsers.put(Browser(network_profile))
+
+    def acquire(self):
+        return self.browsers.get()
+
+    def release(self, browser, origins):
+        try:
+            browser.reset(origins)
+        except WebDriverException as e:
+            print(f"Replacing browser that could not be reset: {e}", file=sys.stderr)
+            try:
+                browser.quit()
+            except WebDriverException:
+                pass
+            browser = Browser(self.network_profile)
+        self.browsers.put(browser)
+
+    def close(self):
+        while not self.browsers.empty():
+            self.browsers.get().quit()
+
+
+class PagePerfTimer(object):
+    def __init__(
+        self, server, username, password, end_step=None, run_id=None, workflow_name=None, category=None,
+        browser=None, download_connections=1, wait_strategy="event", monitor_invocation=False,
+        iterations=1, sink=None, span_tree=False, session_cache=None,
+        tool_queries=None, tool_ids=None, form_workers=1, cache_passes=False,
+        network_profile=None, upload_size=0, upload_chunk_size=10 * 1024 * 1024, upload_parallelism=1,
+        upload_seed=0, history_sizes=None, history_build_workers=8,
+    ):
+        self.run_id = run_id or uuid.uuid4()
+        self.server = server.rstrip("/")
+        self.username = username
+        self.password = password
+        self.end_step = end_step
+        self.workflow_name = workflow_name
+        self.category = category
+        self.download_connections = download_connections
+        self.wait_strategy = wait_strategy
+        self.monitor_invocation = monitor_invocation
+        self.iterations = iterations
+        self.session_cache = session_cache
+        # queries to sweep instead of running the user flow, see tool_search_sweep
+        self.tool_queries = tool_queries
+        # tool forms to benchmark instead of running the user flow
+        self.tool_ids = tool_ids
+        self.form_workers = form_workers
+        # load each page twice, with a cold and then a warm browser cache
+        self.cache_passes = cache_passes
+        self.cache_state = ""
+        self.network_profile = network_profile
+        # bytes of generated data to push through the resumable upload API, or 0 to skip
+        self.upload_size = upload_size
+        self.upload_chunk_size = upload_chunk_size
+        self.upload_parallelism = upload_parallelism
+        self.upload_seed = upload_seed
+        # history sizes to benchmark the history panel with instead of running the user flow
+        self.history_sizes = history_sizes
+        self.history_build_workers = history_build_workers
+        # whether the run logged in or used a cached session, if the cache is enabled
+        self.session_source = "login" if session_cache else ""
+        self.spans = SpanTimer()
+        # write each step as soon as it is clocked, if given a sink
+        self.writer = StepWriter(sink, self.line_tags, span_tree) if sink else None
+        self.step_start = None
+        # origins that may hold session state, cleared when a pooled browser is reset
+        self.visited_origins = [self.server]
+
+        # Use a browser from a pool if given, else start our own
+        self.owns_browser = browser is None
+        self.browser = browser or Browser(network_profile)
+        self.browser_released = False
+        self.driver = self.browser.driver
+        self.wait = WebDriverWait(self.driver, 180)
+        self.event_wait = EventWait(self.driver, 180)
+
+    def before_step(self, action_name):
+        self.event_wait.last_matched = None
+        if self.browser_released:
+            self.step_start = None
+            return
+        try:
+            self.step_start = self.driver.execute_script(BROWSER_STEP_START_JS)
+        except WebDriverException:
+            self.step_start = None
+
+    def after_step(self, span):
+        if self.cache_state:
+            span.tags["cache"] = self.cache_state
+        self.record_browser_timing(span)
+        if self.writer:
+            self.writer.write_completed(self.spans)
+
+    def record_browser_timing(self, span):
+        """
+        Record the browser's own timings for the step, so that slow steps
+        can be attributed to specific requests. If the step ended with an
+        event wait, also record the time taken until the awaited element
+        appeared in the page, free of WebDriver round trips.
+        """
+        if self.event_wait.last_matched:
+            span.fields["page_time_taken"] = (self.event_wait.last_matched - span.start_timestamp) / 1e9
+        if not self.step_start or self.browser_released:
+            return
+        try:
+            browser_timing = self.driver.execute_script(
+                BROWSER_STEP_END_JS, *self.step_start, SLOW_REQUEST_COUNT
+            )
+        except WebDriverException as e:
+            print(f"Could not collect browser timings for {span.name}: {e}", file=sys.stderr)
+            return
+        slow_requests = browser_timing.pop("slow_requests", [])
+        span.add_record("user_flow_browser_timing", browser_timing)
+        for rank, request in enumerate(slow_requests, start=1):
+            span.add_record("user_flow_slow_request", request, rank=rank)
+
+    def browser_cookies(self):
+        all_cookies = self.driver.get_cookies()
+        return {cookie["name"]: cookie["value"] for cookie in all_cookies}
+
+    def api_session(self):
+        """
+        A requests session authenticated with the browser's cookies
+        """
+        return galaxy_api.create_session(cookies=self.browser_cookies())
+
+    def release_browser(self):
+        """
+        Quit the browser early, when no later step needs it
+        """
+        if self.owns_browser and not self.browser_released:
+            self.browser.quit()
+            self.browser_released = True
+
+    def find_login_button(self):
+        with SeleniumCustomWait(self.driver, 0):
+            try:
+                return self.driver.find_element(By.NAME, "login")
+            except NoSuchElementException:
+                return None
+
+    def find_sign_in_with_email(self):
+        with SeleniumCustomWait(self.driver, 0):
+            try:
+                return self.driver.find_element(
+                    By.XPATH, "//a[contains(., 'Sign in with email')]"
+                )
+            except NoSuchElementException:
+                return None
+
+    def find_biocommons_login_button(self):
+        with SeleniumCustomWait(self.driver, 0):
+            try:
+                return self.driver.find_element(
+                    By.XPATH, "//button[contains(., 'BioCommons Access')]"
+                )
+            except NoSuchElementException:
+                return None
+
+    def is_able_to_login(self, driver):
+        if self.find_login_button():
+            return True
+        elif self.find_sign_in_with_email():
+            return True
+        elif self.find_biocommons_login_button():
+            return True
+        else:
+            return False
+
+    def wait_for_element(self, locator, timeout=180):
+        if self.wait_strategy == "event":
+            self.event_wait.until([locator], timeout=timeout)
+            return self.driver.find_element(*locator)
+        return WebDriverWait(self.driver, timeout).until(
+            expected_conditions.presence_of_element_located(locator)
+        )
+
+    def wait_for_element_to_disappear(self, locator, timeout=180):
+        if self.wait_strategy == "event":
+            self.event_wait.until([locator], present=False, timeout=timeout)
+        else:
+            WebDriverWait(self.driver, timeout).until(
+                expected_conditions.invisibility_of_element_located(locator)
+            )
+
+    def wait_until_able_to_login(self):
+        if self.wait_strategy == "event":
+            self.event_wait.until(
+                [
+                    (By.NAME, "login"),
+                    (By.XPATH, "//a[contains(., 'Sign in with email')]"),
+                    (By.XPATH, "//button[contains(., 'BioCommons Access')]"),
+                ]
+            )
+        else:
+            self.wait.until(self.is_able_to_login)
+
+    def wait_for_history_panel_to_load(self):
+        self.wait_for_element((By.XPATH, "//div/nav/h2[contains(., 'History')]"))
+
+    def repeat_steps(self, *steps, prepare=None):
+        """
+        Run a group of cheap steps self.iterations times within the same
+        session, calling prepare before each repeat to get back to where the
+        group starts. Stopping at end_step is deferred to the last iteration.
+        """
+        for iteration in range(self.iterations):
+            if iteration and prepare:
+                prepare()
+            try:
+                for step in steps:
+                    step()
+            except EndStepReached:
+                if iteration == self.iterations - 1:
+                    raise
+                continue
+
+    def reload_homepage(self):
+        self.driver.get(self.server)
+        self.wait_for_galaxy_homepage()
+
+    def set_cache_state(self, cache):
+        """
+        Bypass the browser cache for the cold pass of a page load, and use
+        it again otherwise
+        """
+        self.driver.network.set_cache_behavior("bypass" if cache == "cold" else "default")
+        self.cache_state = cache or ""
+
+    def load_page(self, cold_step, warm_step=None):
+        """
+        With cache passes enabled, run a page load step with the browser
+        cache bypassed, then run it again (or warm_step, if the step cannot
+        simply be repeated) with the now warm cache. Stopping at end_step is
+        deferred until both passes have run.
+        """
+        if not self.cache_passes:
+            cold_step()
+            return
+        end_reached = None
+        for cache, step in (("cold", cold_step), ("warm", warm_step or cold_step)):
+            self.set_cache_state(cache)
+            try:
+                step()
+            except EndStepReached as e:
+                end_reached = e
+            finally:
+                self.set_cache_state(None)
+        if end_reached:
+            raise end_reached
+
+    @clock_action("login_page_load")
+    def load_galaxy_login(self):
+        # Open Galaxy window
+        self.driver.get(f"{self.server}/login")
+        # Wait for username entry to appear
+        self.wait_until_able_to_login()
+
+    def wait_for_galaxy_homepage(self):
+        # Wait for tool search box to appear
+        self.wait_for_element((By.XPATH, "//input[@placeholder='search tools']"))
+        # Wait for tool panel to load
+        self.wait_for_element(
+            (
+                By.XPATH,
+                "//div[@class='tool-panel-section']//a[contains(@class, 'title-link') and contains(., 'Get Data')]",
+            )
+        )
+
+    def login_with_biocommons(self):
+        self.find_biocommons_login_button().click()
+        self.wait_for_element((By.ID, "username")).send_keys(self.username)
+        idp_url = urlparse(self.driver.current_url)
+        self.visited_origins.append(f"{idp_url.scheme}://{idp_url.netloc}")
+        password_input = self.driver.find_element(By.ID, "password")
+        password_input.send_keys(self.password)
+        password_input.send_keys(Keys.ENTER)
+
+    def login_with_galaxy_internal_login(self):
+        elem = self.find_sign_in_with_email()
+        # if sign in with email is available, this is galaxy-au's customised page.
+        if elem:
+            elem.click()
+        # Click username textbox
+        self.driver.find_element(By.NAME, "login").click()
+        # Type in username
+        self.driver.find_element(By.NAME, "login").send_keys(self.username)
+        # Type in password
+        self.driver.find_element(By.NAME, "password").send_keys(self.password)
+        # Submit login form
+        self.driver.find_element(By.NAME, "password").send_keys(Keys.ENTER)
+
+    @clock_action("home_page_load")
+    def login_to_galaxy_homepage(self):
+        with self.spans.span("submit_login"):
+            if self.find_biocommons_login_button():
+                self.login_with_biocommons()
+            else:
+                self.login_with_galaxy_internal_login()
+        with self.spans.span("wait_homepage"):
+            self.wait_for_galaxy_homepage()
+
+    @clock_action("home_page_load")
+    def load_homepage(self):
+        self.reload_homepage()
+
+    def restore_cached_session(self):
+        """
+        Load the cached session's cookies into the browser, if there is a
+        cached session and the server confirms it is still logged in.
+        Returns true if the session was restored.
+        """
+        if not self.session_cache or self.end_step == "login_page_load":
+            return False
+        cookies = self.session_cache.load()
+        if cookies is None:
+            return False
+        if not self.session_cache.is_logged_in(cookies):
+            self.session_cache.clear()
+            return False
+        self.load_cookies(self.driver, cookies)
+        self.session_source = "cached"
+        return True
+
+    def load_cookies(self, driver, cookies):
+        # cookies can only be added for the page currently loaded
+        driver.get(f"{self.server}/api/version")
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+
+    def save_session(self):
+        if self.session_cache:
+            self.session_cache.save(self.driver.get_cookies())
+
+    @clock_action("dummy_file_upload")
+    def upload_dummy_file(self):
+        self.upload_file("https://s3.amazonaws.com/1000genomes/phase1/data/HG00553/exome_alignment/HG00553.mapped.illumina.mosaik.PUR.exome.20110411.bam")
+
+    def upload_file(self, url):
+        with self.spans.span("submit"):
+            upload_activity = self.driver.find_element(By.ID, "activity-upload")
+            upload_activity.click()
+            # paste/fetch data
+            paste_button = self.driver.find_element(By.ID, "btn-new")
+            paste_button.click()
+            # paste/fetch data
+            upload_row = self.driver.find_element(By.XPATH, "//div[@id='upload-row-0']//textarea")
+            upload_row.send_keys(url)
+            # start
+            start_button = self.driver.find_element(By.ID, "btn-start")
+            start_button.click()
+            # close
+            close_button = self.driver.find_element(By.ID, "btn-close")
+            close_button.click()
+        # wait for history item to appear
+        filename = url.rsplit("/", 1)[-1]
+        with self.spans.span("wait_running"):
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    f"//div[@data-index='0']//div[@data-state='running' and contains(., '{filename}')]",
+                )
+            )
+        # wait for item to complete
+        with self.spans.span("wait_ok"):
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    f"//div[@data-index='0']//div[@data-state='ok' and contains(., '{filename}')]",
+                ),
+                timeout=14400,
+            )
+
+    @clock_action("local_file_upload")
+    def upload_local_file(self):
+        """
+        Push generated data through the resumable upload API into the
+        current history, then wait for the dataset to be ok, so that upload
+        bandwidth is measured apart from remote fetches and the job queue
+        """
+        session = self.api_session()
+        history = galaxy_api.get_json(session, f"{self.server}/history/current_history_json")
+        name = f"page_perf_upload_{self.upload_size}_{self.upload_seed}.dat"
+        with self.spans.span("upload") as span:
+            result = TusUploader(
+                session,
+                self.server,
+                SeededData(self.upload_size, self.upload_seed),
+                self.upload_chunk_size,
+                parallelism=self.upload_parallelism,
+                name=name,
+            ).upload()
+            span.add_record("user_flow_upload", result.fields())
+        # from the upload completing until the dataset is ok
+        with self.spans.span("wait_ok") as span:
+            response = galaxy_api.post_json(
+                session, f"{self.server}/api/tools/fetch", fetch_payload(history["id"], result.session_id, name)
+            )
+            job, dataset = wait_for_upload_job(session, self.server, response, timeout=14400)
+            fields = job.fields()
+            fields["file_size"] = dataset.get("file_size")
+            fields["size_matches"] = dataset.get("file_size") == self.upload_size
+            span.add_record("user_flow_upload_job", fields, state=dataset.get("state"))
+        if dataset.get("state") != "ok":
+            raise ValueError(f"Uploaded dataset is {dataset.get('state')}, not ok")
+
+    def download_file(self, filename):
+        with self.spans.span("find_download_link"):
+            open_download_link = self.driver.find_element(By.XPATH, f"//div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]")
+            open_download_link.click()
+            with SeleniumCustomWait(self.driver, 1200):
+                download_link = self.driver.find_element(By.XPATH, f"//div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]//a[@title='Download'] | //div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]//div[@title='Download']//a[contains(text(), 'Download Dataset')]")
+        with self.spans.span("download") as span:
+            result = RangedDownloader(
+                download_link.get_attribute("href"), cookies=self.browser_cookies(), connections=self.download_connections
+            ).download()
+        span.add_record("user_flow_download", result.fields())
+        return result.md5
+
+    @clock_action("dummy_file_download")
+    def download_dummy_file(self):
+        md5_sum = self.download_file("HG00553.mapped")
+        assert md5_sum == "6d178dd0bd8653087c14e150674f8784"
+
+    @clock_action("jbrowse_file_download")
+    def download_jbrowse_file(self):
+        self.download_file("JBrowse")
+
+    @clock_action("tool_search_load")
+    def search_for_tool(self):
+        # Select tool search box
+        tool_search = self.driver.find_element(
+            By.XPATH, "//input[@placeholder='search tools']"
+        )
+        tool_search.click()
+        # Search for BWA
+        tool_search.send_keys("bwa")
+        # Wait for BWA tool to appear
+        self.wait_for_element(
+            (
+                By.XPATH,
+                "//a[starts-with(@href, '/tool_runner?tool_id=toolshed.g2.bx.psu.edu%2Frepos%2Fdevteam%2Fbwa%2Fbwa%2F0.7')]",
+            )
+        )
+
+    @clock_action("tool_form_load")
+    def load_tool_form(self):
+        # Select BWA tool
+        bwa_tool = self.driver.find_element(
+            By.XPATH,
+            "//a[starts-with(@href,'/tool_runner?tool_id=toolshed.g2.bx.psu.edu%2Frepos%2Fdevteam%2Fbwa%2Fbwa%2F0.7')]",
+        )
+        bwa_tool.click()
+        # Wait for tool form to load and execute button to appear
+        self.wait_for_element((By.ID, "execute"))
+
+    @clock_action("tool_search_sweep")
+    def sweep_tool_search(self):
+        """
+        Run every query through the tool search box and the tool search API,
+        self.iterations times. Which channel goes first alternates between
+        queries, so that neither always sees a warm search index.
+        """
+        results = SweepResults()
+        session = self.api_session()
+        with self.spans.span("queries", queries=len(self.tool_queries) * self.iterations) as span:
+            try:
+                for iteration in range(self.iterations):
+                    results.iteration = iteration
+                    for index, tool_query in enumerate(self.tool_queries):
+                        searches = [self.search_tool_ui, self.search_tool_api]
+                        if index % 2:
+                            searches.reverse()
+                        for search in searches:
+                            search(tool_query, results, session)
+            finally:
+                for measurement, tags, fields in results.records + results.summary_records():
+                    span.add_record(measurement, fields, **tags)
+
+    def search_tool_ui(self, tool_query, results, session):
+        tool_search = self.driver.find_element(By.XPATH, "//input[@placeholder='search tools']")
+        tool_link = (
+            By.XPATH,
+            f"//a[starts-with(@href, '/tool_runner?tool_id={quote(tool_query.expected_tool_id, safe='')}')]",
+        )
+        # Clear the previous query, and make sure its results are gone
+        tool_search.send_keys(Keys.CONTROL, "a")
+        tool_search.send_keys(Keys.DELETE)
+        try:
+            self.wait_for_element_to_disappear(tool_link, timeout=TOOL_SEARCH_TIMEOUT)
+        except TimeoutException:
+            pass
+        start = time.perf_counter()
+        tool_search.send_keys(tool_query.query)
+        try:
+            self.wait_for_element(tool_link, timeout=TOOL_SEARCH_TIMEOUT)
+            found = True
+        except TimeoutException:
+            found = False
+        results.add("ui", tool_query, time.perf_counter() - start, found)
+
+    def search_tool_api(self, tool_query, results, session):
+        try:
+            time_taken, tool_ids = search_tools_api(session, self.server, tool_query.query)
+        except requests.RequestException as e:
+            print(f"Tool search for {tool_query.query!r} failed: {e}", file=sys.stderr)
+            return
+        rank = tool_query.rank(tool_ids)
+        results.add("api", tool_query, time_taken, rank is not None, rank=rank, result_count=len(tool_ids))
+
+    @clock_action("tool_form_benchmark")
+    def benchmark_tool_forms(self):
+        """
+        Load the form of every tool in self.tool_ids, spread across
+        self.form_workers browsers sharing this browser's session
+        """
+        cookies = self.driver.get_cookies()
+        tool_queue = queue.Queue()
+        for tool_id in self.tool_ids:
+            tool_queue.put(tool_id)
+        with self.spans.span("forms", tools=len(self.tool_ids), workers=self.form_workers) as span:
+            lock = threading.Lock()
+            histogram = LatencyHistogram()
+
+            def record(tool_id, worker, fields):
+                with lock:
+                    span.add_record("tool_form_benchmark", fields, tool_id=tool_id, worker=worker)
+                    if fields["loaded"]:
+                        histogram.record(fields["form_time"])
+
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.form_workers) as executor:
+                    futures = [
+                        executor.submit(self.load_tool_forms, worker, tool_queue, record, cookies)
+                        for worker in range(self.form_workers)
+                    ]
+                    for future in futures:
+                        future.result()
+            finally:
+                if histogram.count:
+                    span.add_record("tool_form_summary", histogram.summary_fields())
+
+    def load_tool_forms(self, worker, tool_queue, record, cookies):
+        """
+        Load tool forms from the queue until it is empty. The first worker
+        uses this browser, and the others start their own.
+        """
+        browser = None
+        driver = self.driver
+        if worker:
+            browser = Browser(self.network_profile)
+            driver = browser.driver
+        try:
+            if browser:
+                self.load_cookies(driver, cookies)
+            while True:
+                try:
+                    tool_id = tool_queue.get_nowait()
+                except queue.Empty:
+                    return
+                record(tool_id, worker, self.time_tool_form(driver, tool_id))
+        finally:
+            if browser:
+                browser.quit()
+
+    def time_tool_form(self, driver, tool_id):
+        """
+        Load a tool's form, and return the time taken until it rendered
+        along with the timings of its build request
+        """
+        start = time.perf_counter()
+        driver.get(f"{self.server}/tool_runner?tool_id={quote(tool_id, safe='')}")
+        try:
+            if self.wait_strategy == "event":
+                loaded = EventWait(driver).until([(By.ID, "execute"), TOOL_FORM_ERROR], timeout=TOOL_FORM_TIMEOUT) == 0
+            else:
+                WebDriverWait(driver, TOOL_FORM_TIMEOUT).until(
+                    expected_conditions.presence_of_element_located((By.ID, "execute"))
+                )
+                loaded = True
+        except TimeoutException:
+            loaded = False
+        fields = {"form_time": time.perf_counter() - start, "loaded": loaded}
+        try:
+            fields.update(driver.execute_script(TOOL_FORM_BUILD_JS) or {})
+        except WebDriverException as e:
+            print(f"Could not collect build timings for {tool_id}: {e}", file=sys.stderr)
+        return fields
+
+    @clock_action("history_scaling")
+    def benchmark_history_scaling(self):
+        """
+        Time switching to, loading and scrolling through a history of each
+        of self.history_sizes, building any that do not exist yet
+        """
+        session = self.api_session()
+        builder = HistoryBuilder(session, self.server, workers=self.history_build_workers)
+        with self.spans.span("build", sizes=len(self.history_sizes)) as span:
+            # every switch starts from the same empty history
+            empty = builder.ensure(0)
+            histories = []
+            for size in self.history_sizes:
+                history = builder.ensure(size)
+                histories.append(history)
+                span.add_record(
+                    "history_scaling_build",
+                    {"items": history.count, "built": history.built, "build_time": history.build_time},
+                    history_size=size,
+                )
+        results = ScalingResults()
+        with self.spans.span("measure", sizes=len(histories), iterations=self.iterations) as span:
+            try:
+                for iteration in range(self.iterations):
+                    for history in histories:
+                        results.add(history, iteration, self.time_history(session, history, empty))
+            finally:
+                for measurement, tags, fields in results.records + results.summary_records():
+                    span.add_record(measurement, fields, **tags)
+
+    def time_history(self, session, history, empty):
+        """
+        Switch to the history from the histories list, then reload the
+        page to time the panel's first render, and scroll to its oldest
+        item. Returns the times taken, with None for any that timed out.
+        """
+        response = session.put(
+            f"{self.server}/history/set_as_current", params={"id": empty.history_id}, timeout=galaxy_api.REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        first_item = (
+            By.XPATH,
+            f"//div[@id='current-history-panel'][.//h3[contains(., '{history.name}')]]//div[@data-hid]",
+        )
+        self.driver.get(f"{self.server}/histories/list")
+        search_input = self.driver.find_element(By.XPATH, "//input[@placeholder='search histories']")
+        search_input.send_keys(history.name)
+        name_button = self.driver.find_element(
+            By.XPATH, f"//table[@class='grid-table']//button[contains(., '{history.name}')]"
+        )
+        # Workaround for ElementClickInterceptedException
+        self.driver.execute_script("arguments[0].click();", name_button)
+        switch_button = name_button.find_element(
+            By.XPATH, "./following-sibling::div//button[contains(@data-description, 'grid operation switch')]"
+        )
+        start = time.perf_counter()
+        switch_button.click()
+        fields = {"switch_time": self.time_wait_for_element(first_item, start)}
+        start = time.perf_counter()
+        self.driver.get(f"{self.server}/")
+        fields["panel_load_time"] = self.time_wait_for_element(first_item, start)
+        fields["scroll_time"] = self.scroll_history_panel(history.min_hid)
+        return fields
+
+    def time_wait_for_element(self, locator, start):
+        try:
+            self.wait_for_element(locator, timeout=HISTORY_PANEL_TIMEOUT)
+        except TimeoutException:
+            return None
+        return time.perf_counter() - start
+
+    def scroll_history_panel(self, hid):
+        """
+        Scroll the history panel down until the item with hid has rendered.
+        Returns the time taken, as measured in the page.
+        """
+        self.driver.set_script_timeout(HISTORY_PANEL_TIMEOUT + 30)
+        try:
+            elapsed = self.driver.execute_async_script(
+                HISTORY_SCROLL_JS, f"[data-hid='{hid}']", HISTORY_PANEL_TIMEOUT * 1000
+            )
+        except (JavascriptException, TimeoutException) as e:
+            print(f"Could not scroll the history panel: {e}", file=sys.stderr)
+            return None
+        return elapsed / 1000 if elapsed is not None else None
+
+    @clock_action("published_histories_page_load")
+    def load_published_histories(self):
+        with self.spans.span("wait_histories_list"):
+            # Request history page
+            self.driver.get(f"{self.server}/histories/list_published")
+
+            # Wait for history page to load
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    "//li[@id='histories-published-tab' and contains(., 'Public Histories')]",
+                )
+            )
+        with self.spans.span("wait_history_panel"):
+            self.wait_for_history_panel_to_load()
+
+    @clock_action("import_published_history")
+    def import_published_history(self):
+        with self.spans.span("search"):
+            # Search for the relevant history
+            search_history_input = self.driver.find_element(
+                By.XPATH,
+                f"//div[@id='histories-published-grid']//input[@placeholder='search histories']",
+            )
+            search_history_input.click()
+            search_history_input.send_keys(f"{self.workflow_name.lower()}_input_data")
+
+            # Select relevant history
+            import_history_btn = self.driver.find_element(
+                By.XPATH,
+                f"//table[@class='grid-table']//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{self.workflow_name.lower()}_input_data')]",
+            )
+            # Workaround for ElementClickInterceptedException
+            self.driver.execute_script("arguments[0].click();", import_history_btn)
+
+        with self.spans.span("view"):
+            # View history details
+            view_history_menu_item = import_history_btn.find_element(
+                By.XPATH,
+                f"./following-sibling::div//button[contains(@data-description, 'grid operation view')]",
+            )
+            view_history_menu_item.click()
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    f"//h3[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{self.workflow_name.lower()}_input_data')]",
+                )
+            )
+
+        with self.spans.span("copy"):
+            # Invoke copy history dialogue
+            import_history_btn = self.driver.find_element(
+                By.XPATH,
+                f"//button[@title='Import this history' and contains(., 'Import this history')]",
+            )
+            import_history_btn.click()
+
+            # Set new history name
+            history_name_box = self.driver.find_element(By.ID, "copy-modal-title")
+            history_name_box.clear()
+            history_name_box.send_keys(f"{self.workflow_name}_Input_data_{self.run_id}")
+            self.driver.find_element(
+                By.XPATH,
+                f"//button[contains(., 'Copy History')]",
+            ).click()
+
+            # activate the history
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    f"//div[@class='alert alert-info' and contains(., 'History imported and is now your active history')]",
+                )
+            )
+
+        with self.spans.span("activate"):
+            # Request history page
+            self.driver.get(f"{self.server}/histories/list")
+
+            # Wait for history panel to load with new history
+            self.wait_for_element(
+                (
+                    By.XPATH,
+                    f"//div[@id='current-history-panel']//h3[contains(., '{self.workflow_name}_Input_data_{self.run_id}')]",
+                )
+            )
+
+    @clock_action("workflow_list_page_load")
+    def load_workflow_list(self):
+        # Request workflows list page
+        self.driver.get(f"{self.server}/workflows/list_published")
+        # Wait for workflow page to load and import button to appear
+        self.wait_for_element((By.XPATH, "//li[@id='published' and contains(., 'Public workflows')]"))
+
+    @clock_action("workflow_run_page_load")
+    def load_workflow_run_form(self):
+        # Search for the relevant history
+        search_workflow_input = self.driver.find_element(
+            By.XPATH,
+            f"//div[@id='workflow-list-filter']//input",
+        )
+        search_workflow_input.click()
+        search_workflow_input.send_keys(f"{self.workflow_name.lower()}")
+
+        # wait for list to be filtered
+        self.wait.until(
+            lambda d: len(
+                d.find_elements(By.CSS_SELECTOR, "#workflow-cards .workflow-card")
+            )
+            == 1
+        )
+
+        # Select relevant workflow
+        run_workflow_btn = self.driver.find_element(By.ID, "workflow-run-button")
+        # Workaround for ElementClickInterceptedException
+        self.driver.execute_script("arguments[0].click();", run_workflow_btn)
+
+        # Wait for workflow form to load and run button to appear
+        self.wait_for_element((By.ID, "run-workflow"))
+
+    @clock_action("workflow_run_page_load")
+    def reload_workflow_run_form(self):
+        self.driver.refresh()
+        self.wait_for_element((By.ID, "run-workflow"))
+
+    @clock_action("run_workflow")
+    def run_workflow(self):
+        if self.workflow_name == "Selenium_test_1":
+            # Select relevant choice
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='1']//input[1]/following-sibling::span[1]",
+            )
+            input_1_select.click()
+            # Select relevant choice
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='1']//ul[@role='listbox']//li[@role='option']//span[contains(., 'Subsample of reads from human exome R1')]",
+            )
+            input_1_select.click()
+            workflow_wait = 14400 # 4 hours
+        elif self.workflow_name == "Selenium_test_2":
+            # Select relevant choice
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='1']//input[1]/following-sibling::span[1]",
+            )
+            input_1_select.click()
+            # Select relevant choice
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='1']//ul[@role='listbox']//li[@role='option']//span[contains(., 'Subsample of reads from human exome R1')]",
+            )
+            input_1_select.click()
+            workflow_wait = 14400
+        elif self.workflow_name == "Selenium_test_3":
+            # Select forward reads
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='Forward Reads']//input[1]/following-sibling::span[1]",
+            )
+            input_1_select.click()
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='Forward Reads']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ERR019289_1.fastq.gz')]",
+            )
+            input_1_select.click()
+            # Select reverse reads
+            input_2_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='Reverse Reads']//input[1]/following-sibling::span[1]",
+            )
+            input_2_select.click()
+            input_2_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='Reverse Reads']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ERR019289_2.fastq.gz')]",
+            )
+            input_2_select.click()
+            workflow_wait = 14400
+        elif self.workflow_name == "Selenium_test_4" or self.workflow_name == "Selenium_test_6":
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='ARTIC primers to amplicon assignments']//input[1]/following-sibling::span[1]",
+            )
+            input_1_select.click()
+            # Select relevant choice
+            input_1_select = self.driver.find_element(
+                By.XPATH,
+                "//div[@data-label='ARTIC primers to amplicon assignments']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ARTIC_SARS_CoV-2_amplicon_info_v3.tsv')]",
+            )
+            input_1_select.click()
+            workflow_wait = 18000 # 5 hours
+        elif self.workflow_name == "Selenium_test_5":
+            workflow_wait = 21600 # 6 hours
+        elif self.workflow_name == "Selenium_test_7":
+            workflow_wait = 36000 # 10 hours
+        else:
+            raise Exception(f"Workflow name not in known list: {self.workflow_name}")
+
+        with self.spans.span("submit"):
+            # Run the workflow
+            self.driver.find_element(By.ID, "run-workflow").click()
+
+            # wait for the running message to appear
+            loading_xpath = "//div[@id='center']//div[@role='tabpanel']//div[@role='alert']//span[@data-description='loading message' and contains(., 'Waiting to complete invocation')]"
+            self.wait_for_element((By.XPATH, loading_xpath))
+
+            invocation_id = self.find_invocation_id() if self.monitor_invocation else None
+
+        if invocation_id:
+            self.monitor_workflow_invocation(invocation_id, workflow_wait)
+        else:
+            with self.spans.span("wait_invocation"):
+                # Wait for running message to disappear
+                self.wait_for_element_to_disappear((By.XPATH, loading_xpath), timeout=workflow_wait)
+
+    def find_invocation_id(self):
+        """
+        Return the id of the latest invocation in the current history
+        """
+        session = self.api_session()
+        history = galaxy_api.get_json(session, f"{self.server}/history/current_history_json")
+        invocations = galaxy_api.get_json(
+            session,
+            f"{self.server}/api/invocations",
+            history_id=history["id"],
+            limit=1,
+            sort_by="create_time",
+            sort_desc=True,
+        )
+        return invocations[0]["id"] if invocations else None
+
+    def monitor_workflow_invocation(self, invocation_id, timeout):
+        """
+        Follow the invocation through the API rather than the browser,
+        recording the queued and running times of each of its jobs. The
+        browser is released while waiting if no later step needs it.
+        """
+        session = self.api_session()
+        # The step no longer ends with an in-page wait
+        self.event_wait.last_matched = None
+        if self.workflow_name not in BROWSER_STEPS_AFTER_WORKFLOW:
+            self.release_browser()
+        with self.spans.span("wait_invocation", invocation_id=invocation_id) as span:
+            monitor = InvocationMonitor(session, self.server, invocation_id, timeout)
+            try:
+                monitor.wait()
+            finally:
+                for measurement, tags, fields in monitor.records():
+                    span.add_record(measurement, fields, **tags)
+
+    def log_in(self):
+        if self.restore_cached_session():
+            self.load_page(self.load_homepage)
+        else:
+            self.load_page(self.load_galaxy_login)
+            self.load_page(self.login_to_galaxy_homepage, self.load_homepage)
+            self.save_session()
+
+    def run_test_sequence(self):
+        self.log_in()
+        if self.tool_queries:
+            self.sweep_tool_search()
+            return
+        if self.tool_ids:
+            self.benchmark_tool_forms()
+            return
+        if self.history_sizes:
+            self.benchmark_history_scaling()
+            return
+        self.repeat_steps(self.search_for_tool, self.load_tool_form, prepare=self.reload_homepage)
+        self.repeat_steps(lambda: self.load_page(self.load_published_histories))
+        self.import_published_history()
+        if self.upload_size:
+            self.upload_local_file()
+        if self.workflow_name == "Selenium_test_5":
+            self.upload_dummy_file()
+        self.repeat_steps(lambda: self.load_page(self.load_workflow_list))
+        self.load_page(self.load_workflow_run_form, self.reload_workflow_run_form)
+        self.run_workflow()
+        if self.workflow_name == "Selenium_test_5":
+            self.download_dummy_file()
+        if self.workflow_name == "Selenium_test_7":
+            self.download_jbrowse_file()
+
+    def measure_timings(self):
+        self.spans = SpanTimer()
+        for span in self.browser.take_spans():
+            self.spans.add(span)
+        try:
+            try:
+                self.run_test_sequence()
+            except EndStepReached:
+                pass
+        finally:
+            if self.owns_browser and not self.browser_released:
+                self.browser.quit()
+            self.write_timings()
+
+    def line_tags(self, action):
+        return {
+            "server": self.server,
+            "action": action,
+            "run_id": self.run_id,
+            "end_step": self.end_step,
+            "workflow_name": self.workflow_name,
+            "category": self.category,
+            "session": self.session_source,
+            "network": self.network_profile.name if self.network_profile else "",
+        }
+
+    def format_timings(self, span_tree=False):
+        lines = format_spans(self.spans, self.line_tags, span_tree)
+        if self.iterations > 1:
+            lines.extend(format_summaries(self.spans, self.line_tags, iterations=self.iterations))
+        return lines
+
+    def write_timings(self):
+        """
+        Write any steps not written yet, and the step summaries, to the sink
+        """
+        if not self.writer:
+            return
+        self.writer.write_completed(self.spans)
+        if self.iterations > 1:
+            self.writer.sink.write(format_summaries(self.spans, self.line_tags, iterations=self.iterations))
+
+
+def read_tool_ids(path):
+    """
+    Read one tool id per line, skipping blank lines and comments
+    """
+    with open(path, encoding="utf-8") as tool_ids_file:
+        lines = [line.strip() for line in tool_ids_file]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def create_perf_timer(args, run_id, browser=None, sink=None):
+    session_cache = None
+    if args.session_cache:
+        session_cache = SessionCache(
+            args.session_cache, args.server.rstrip("/"), args.username, args.password, ttl=args.session_cache_ttl
+        )
+    return PagePerfTimer(
+        args.server,
+        args.username,
+        args.password,
+        args.end_step,
+        run_id,
+        args.workflow_name,
+        args.category,
+        browser=browser,
+        download_connections=args.download_connections,
+        wait_strategy=args.wait_strategy,
+        monitor_invocation=args.monitor_invocation,
+        iterations=args.iterations,
+        sink=sink,
+        span_tree=args.span_tree,
+        session_cache=session_cache,
+        tool_queries=read_tool_queries(args.tool_queries) if args.mode == "tool_search_sweep" else None,
+        tool_ids=read_tool_ids(args.tool_ids) if args.mode == "tool_form_benchmark" else None,
+        form_workers=args.form_workers,
+        cache_passes=args.cache_passes,
+        network_profile=get_network_profile(args),
+        upload_size=int(args.upload_size * 1024 * 1024),
+        upload_chunk_size=int(args.upload_chunk_size * 1024 * 1024),
+        upload_parallelism=args.upload_parallelism,
+        upload_seed=args.upload_seed,
+        history_sizes=args.history_sizes if args.mode == "history_scaling" else None,
+        history_build_workers=args.history_build_workers,
+    )
+
+
+def run_user_flow(args, user_index, start_delay):
+    """
+    Run a single user flow in a worker process. Returns the formatted
+    timings, so that output from concurrent users is not interleaved.
+    """
+    time.sleep(start_delay)
+    try:
+        perf_timer = create_perf_timer(args, f"{args.run_id}-{user_index}")
+    except Exception as e:
+        # e.g. Firefox could not start, which is a failed flow like any other
+        print(f"User {user_index} could not start: {e}", file=sys.stderr)
+        return False, 0, []
+    completed = False
+    try:
+        perf_timer.measure_timings()
+        completed = True
+    except Exception as e:
+        print(f"User {user_index} failed: {e}", file=sys.stderr)
+    steps = [
+        span for span in perf_timer.spans.roots if not span.failed and span.name not in DRIVER_ACTIONS
+    ]
+    return completed, len(steps), perf_timer.format_timings(args.span_tree)
+
+
+def run_pooled_flow(args, pool, browser, sink):
+    """
+    Run a single user flow on a browser from the pool, and return the
+    browser to the pool for reset once done.
+    """
+    perf_timer = None
+    try:
+        perf_timer = create_perf_timer(args, None, browser=browser, sink=sink)
+        perf_timer.measure_timings()
+    except Exception as e:
+        print(f"Run {perf_timer.run_id if perf_timer else 'setup'} failed: {e}", file=sys.stderr)
+    finally:
+        # a run that could not be set up has not visited any origin
+        pool.release(browser, perf_timer.visited_origins if perf_timer else [])
+
+
+def log_pooled_flow_failure(future):
+    """
+    Report a pooled run that raised past run_pooled_flow, e.g. while
+    releasing its browser, which would otherwise be lost with its future
+    """
+    if not future.cancelled() and future.exception():
+        print(f"Pooled run failed: {future.exception()!r}", file=sys.stderr)
+
+
+def run_daemon(args, sink):
+    """
+    Keep a pool of warm browsers and start a user flow every args.interval
+    seconds. If all browsers are busy, the next run waits for one to free up.
+    """
+    pool = BrowserPool(args.pool_size, get_network_profile(args))
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.pool_size) as executor:
+            while True:
+                next_run = time.time() + args.interval
+                browser = pool.acquire()
+                future = executor.submit(run_pooled_flow, args, pool, browser, sink)
+                future.add_done_callback(log_pooled_flow_failure)
+                time.sleep(max(0, next_run - time.time()))
+    finally:
+        pool.close()
+
+
+def run_concurrent_users(args, sink):
+    """
+    Run args.users independent user flows in a process pool, each with
+    its own browser and run_id. User start times are spread evenly
+    across args.ramp_up seconds.
+    """
+    args.run_id = args.run_id or uuid.uuid4()
+    completed_flows = 0
+    total_steps = 0
+    start = time.time()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.users) as executor:
+            futures = [
+                executor.submit(run_user_flow, args, user_index, args.ramp_up * user_index / args.users)
+                for user_index in range(args.users)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    completed, steps, lines = future.result()
+                except Exception as e:
+                    # e.g. the worker process died, counted as a failed flow
+                    print(f"User flow failed: {e!r}", file=sys.stderr)
+                    continue
+                completed_flows += int(completed)
+                total_steps += steps
+                sink.write(lines)
+    finally:
+        # report the throughput of the flows run so far, even if interrupted
+        elapsed = time.time() - start
+        sink.write(
+            [
+                format_line(
+                    "user_flow_throughput",
+                    {
+                        "server": args.server,
+                        "run_id": args.run_id,
+                        "end_step": args.end_step,
+                        "workflow_name": args.workflow_name,
+                        "category": args.category,
+                        "users": args.users,
+                    },
+                    {
+                        "flows_per_min": completed_flows * 60 / elapsed,
+                        "steps_per_sec": total_steps / elapsed,
+                        "completed_flows": completed_flows,
+                        "failed_flows": args.users - completed_flows,
+                        "elapsed": elapsed,
+                    },
+                    time.time_ns(),
+                )
+            ]
+        )
+
+
+def run_self_benchmark(args, sink):
+    """
+    Run the user flow args.iterations times against a local mock Galaxy
+    with known delays, with each wait strategy, and report how far each
+    step's measured time is above the delay injected into it: the timer's
+    own overhead. Returns false if the median overhead of any step is
+    above args.max_overhead.
+    """
+    mock = MockGalaxy()
+    mock.start()
+    browser = Browser()
+    histograms = {}
+    try:
+        for iteration in range(args.iterations):
+            for wait_strategy in ("event", "poll"):
+                perf_timer = PagePerfTimer(
+                    mock.url,
+                    "benchmark@example.org",
+                    "benchmark",
+                    SELF_BENCHMARK_END_STEP,
+                    args.run_id,
+                    "Selenium_test_1",
+                    args.category,
+                    browser=browser,
+                    wait_strategy=wait_strategy,
+                )
+                try:
+                    perf_timer.measure_timings()
+                finally:
+                    browser.reset(perf_timer.visited_origins)
+                lines = perf_timer.format_timings(args.span_tree)
+                for root in perf_timer.spans.roots:
+                    injected = mock.injected_delay(root.name)
+                    if injected is None or root.failed:
+                        continue
+                    fields = {"time_taken": root.elapsed, "injected": injected, "overhead": root.elapsed - injected}
+                    if "page_time_taken" in root.fields:
+                        fields["page_overhead"] = root.fields["page_time_taken"] - injected
+                    tags = dict(perf_timer.line_tags(root.name), wait_strategy=wait_strategy)
+                    lines.append(format_line("timer_overhead", tags, fields, root.end_timestamp))
+                    histograms.setdefault((root.name, wait_strategy), LatencyHistogram()).record(
+                        max(0.0, fields["overhead"])
+                    )
+                sink.write(lines)
+    finally:
+        browser.quit()
+        mock.stop()
+
+    passed = True
+    lines = []
+    for (action, wait_strategy), histogram in histograms.items():
+        fields = histogram.summary_fields()
+        lines.append(
+            format_line(
+                "timer_overhead_summary",
+                {"action": action, "wait_strategy": wait_strategy, "category": args.category},
+                fields,
+                time.time_ns(),
+            )
+        )
+        if args.max_overhead is not None and fields["p50"] > args.max_overhead:
+            print(
+                f"Median overhead of {action} with {wait_strategy} waits is {fields['p50']:.3f}s,"
+                f" above {args.max_overhead}s",
+                file=sys.stderr,
+            )
+            passed = False
+    sink.write(lines)
+    return passed
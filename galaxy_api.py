@@ -0,0 +1,49 @@
+"""
+Helpers for talking to the Galaxy API with requests, shared by the
+browserless probes and by browser steps that need direct API access.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+
+REQUEST_TIMEOUT = 120
+
+
+def create_session(cookies=None, api_key=None, pool_size=10):
+    """
+    Create a session that keeps up to pool_size connections alive per host.
+    Cookies (e.g. copied from a logged in browser) or an API key can be used
+    to authenticate.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if cookies:
+        session.cookies.update(cookies)
+    if api_key:
+        session.headers["x-api-key"] = api_key
+    return session
+
+
+def login(session, server, username, password):
+    """
+    Exchange a username and password for an API key, which is then used to
+    authenticate all further requests made with the session.
+    """
+    response = session.get(
+        f"{server}/api/authenticate/baseauth", auth=(username, password), timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    session.headers["x-api-key"] = response.json()["api_key"]
+
+
+def get_json(session, url, **params):
+    response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def post_json(session, url, payload):
+    response = session.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
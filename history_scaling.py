@@ -0,0 +1,176 @@
+"""
+Histories of increasing size for the history scaling benchmark, built
+through the API and kept between runs, so that the history panel's load,
+scroll and switch times can be tracked against history size across Galaxy
+releases.
+
+Each history is built from one small pasted dataset, copied into the
+history until it holds the wanted number of items. Copies need no jobs, so
+even a 10000 item history is built in minutes, and only on the first run.
+"""
+import concurrent.futures
+import time
+
+import galaxy_api
+from latency_histogram import LatencyHistogram
+from tus_upload import wait_for_upload_job
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+METRICS = ("switch_time", "panel_load_time", "scroll_time")
+
+
+def history_name(size):
+    # the suffix keeps the name of one size from containing that of another
+    return f"page_perf_history_scaling_{size}_items"
+
+
+class ScalingHistory(object):
+    def __init__(self, history_id, name, size, count, min_hid, built, build_time):
+        self.history_id = history_id
+        self.name = name
+        self.size = size
+        self.count = count
+        # hid of the oldest item, the last in the history panel
+        self.min_hid = min_hid
+        # items added on this run
+        self.built = built
+        self.build_time = build_time
+
+
+class HistoryBuilder(object):
+    """
+    Example usage:
+
+    builder = HistoryBuilder(session, server, workers=8)
+    history = builder.ensure(1000)
+    """
+
+    def __init__(self, session, server, workers=8, timeout=3600):
+        self.session = session
+        self.server = server
+        self.workers = workers
+        self.timeout = timeout
+
+    def find(self, name):
+        histories = galaxy_api.get_json(
+            self.session, f"{self.server}/api/histories", q="name", qv=name, keys="id,name"
+        )
+        return histories[0] if histories else None
+
+    def count(self, history_id):
+        """
+        Number of items shown in the history panel, i.e. not deleted or hidden
+        """
+        history = galaxy_api.get_json(
+            self.session, f"{self.server}/api/histories/{history_id}", keys="contents_active"
+        )
+        return history["contents_active"]["active"]
+
+    def contents(self, history_id, order, limit=1):
+        return galaxy_api.get_json(
+            self.session,
+            f"{self.server}/api/histories/{history_id}/contents",
+            v="dev",
+            order=order,
+            limit=limit,
+            q=["deleted", "visible"],
+            qv=["false", "true"],
+        )
+
+    def create_seed_dataset(self, history_id):
+        """
+        Paste a one line dataset into the history, and wait for it to be ok
+        """
+        payload = {
+            "history_id": history_id,
+            "targets": [
+                {
+                    "destination": {"type": "hdas"},
+                    "elements": [
+                        {"src": "pasted", "paste_content": "page perf history scaling\n", "ext": "txt", "name": "item.txt"}
+                    ],
+                }
+            ],
+        }
+        response = galaxy_api.post_json(self.session, f"{self.server}/api/tools/fetch", payload)
+        _, dataset = wait_for_upload_job(self.session, self.server, response, self.timeout)
+        if dataset.get("state") != "ok":
+            raise ValueError(f"Seed dataset for history {history_id} is {dataset.get('state')}, not ok")
+        return dataset["id"]
+
+    def copy_dataset(self, history_id, dataset_id):
+        galaxy_api.post_json(
+            self.session,
+            f"{self.server}/api/histories/{history_id}/contents",
+            {"source": "hda", "content": dataset_id, "type": "dataset"},
+        )
+
+    def ensure(self, size):
+        """
+        Find the history for size, creating it or adding items to it as
+        needed, and return it as a ScalingHistory
+        """
+        start = time.perf_counter()
+        name = history_name(size)
+        history = self.find(name)
+        if history:
+            history_id = history["id"]
+        else:
+            history_id = galaxy_api.post_json(self.session, f"{self.server}/api/histories", {"name": name})["id"]
+        existing = self.count(history_id)
+        built = 0
+        if existing < size:
+            if existing:
+                dataset_id = self.contents(history_id, order="hid-asc")[0]["id"]
+            else:
+                dataset_id = self.create_seed_dataset(history_id)
+                built = 1
+            missing = size - existing - built
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self.copy_dataset, history_id, dataset_id) for _ in range(missing)]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            built += missing
+        oldest = self.contents(history_id, order="hid-asc")
+        return ScalingHistory(
+            history_id,
+            name,
+            size,
+            count=self.count(history_id),
+            min_hid=oldest[0]["hid"] if oldest else None,
+            built=built,
+            build_time=time.perf_counter() - start,
+        )
+
+
+class ScalingResults(object):
+    """
+    Collects the timings of each history size, and formats them as span
+    records: a history_scaling point per size and iteration, and, when run
+    more than once, a history_scaling_summary point per size with the
+    distribution of each metric
+    """
+
+    def __init__(self):
+        self.records = []
+        self.histograms = {}
+
+    def add(self, history, iteration, fields):
+        self.records.append(
+            ("history_scaling", {"history_size": history.size, "iteration": iteration}, dict(fields, items=history.count))
+        )
+        for metric in METRICS:
+            if fields.get(metric) is not None:
+                self.histograms.setdefault((history.size, metric), LatencyHistogram()).record(fields[metric])
+
+    def summary_records(self):
+        summaries = {}
+        for (size, metric), histogram in self.histograms.items():
+            if histogram.count < 2:
+                continue
+            fields = summaries.setdefault(size, {})
+            for name, value in histogram.summary_fields().items():
+                fields[f"{metric}_{name}"] = value
+        return [
+            ("history_scaling_summary", {"history_size": size}, fields) for size, fields in sorted(summaries.items())
+        ]
@@ -0,0 +1,208 @@
+"""
+Follow a workflow invocation through the Galaxy API until it completes,
+recording when each job was first seen queued, running and finished, so
+that a slow run can be split into time spent waiting in the queue and time
+spent computing.
+"""
+import time
+
+import requests
+
+import galaxy_api
+
+# Job states after which a job will not change state again by itself
+TERMINAL_JOB_STATES = ("ok", "error", "failed", "deleted", "deleted_new", "skipped", "paused")
+
+# Invocation states after which no more jobs will be scheduled
+SCHEDULED_INVOCATION_STATES = ("scheduled",)
+FAILED_INVOCATION_STATES = ("failed", "cancelled", "cancelling")
+
+
+class JobRecord(object):
+    def __init__(self, job_id, tool_id=None, step=None):
+        self.job_id = job_id
+        self.tool_id = tool_id
+        self.step = step
+        self.state = None
+        # unix time at which the job was first seen in each state, on this
+        # machine's clock so that server clock skew does not leak in
+        self.first_seen = {}
+        self.metrics = {}
+
+    def observe(self, job, now):
+        self.tool_id = job.get("tool_id") or self.tool_id
+        changed = job["state"] != self.state
+        self.state = job["state"]
+        self.first_seen.setdefault(self.state, now)
+        return changed
+
+    @property
+    def finished(self):
+        return self.state in TERMINAL_JOB_STATES
+
+    @property
+    def queued_at(self):
+        return self.first_seen.get("new") or self.first_seen.get("queued")
+
+    @property
+    def running_at(self):
+        return self.first_seen.get("running")
+
+    @property
+    def finished_at(self):
+        return self.first_seen.get(self.state) if self.finished else None
+
+    def fields(self):
+        queued, running, finished = self.queued_at, self.running_at, self.finished_at
+        return {
+            "queue_seconds": running - queued if running and queued else None,
+            "run_seconds": finished - running if finished and running else None,
+            "total_seconds": finished - queued if finished and queued else None,
+            # the job's own run time, where job metrics are visible to the user
+            "runtime_seconds": self.metrics.get("runtime_seconds"),
+        }
+
+
+class JobStateTracker(object):
+    """
+    Keeps a JobRecord for every job seen, updated from each poll of the jobs API
+    """
+
+    def __init__(self, session, server):
+        self.session = session
+        self.server = server
+        self.jobs = {}
+
+    def observe(self, jobs, steps=None):
+        """
+        Record the current state of each job. Returns true if any job changed state.
+        """
+        steps = steps or {}
+        now = time.time()
+        changed = False
+        for job in jobs:
+            record = self.jobs.get(job["id"])
+            if not record:
+                record = self.jobs[job["id"]] = JobRecord(job["id"], step=steps.get(job["id"]))
+            was_finished = record.finished
+            changed = record.observe(job, now) or changed
+            if record.finished and not was_finished:
+                self.fetch_metrics(record)
+        return changed
+
+    def fetch_metrics(self, record):
+        try:
+            metrics = galaxy_api.get_json(self.session, f"{self.server}/api/jobs/{record.job_id}/metrics")
+        except requests.RequestException:
+            # metrics are not exposed to all users
+            return
+        for metric in metrics:
+            if metric.get("name") == "runtime_seconds":
+                try:
+                    record.metrics[metric["name"]] = float(metric["raw_value"])
+                except (KeyError, TypeError, ValueError):
+                    pass
+
+    @property
+    def all_finished(self):
+        return all(record.finished for record in self.jobs.values())
+
+
+class InvocationMonitor(object):
+    """
+    Example usage:
+
+    monitor = InvocationMonitor(session, server, invocation_id, timeout=14400)
+    monitor.wait()
+    for measurement, tags, fields in monitor.records():
+        ...
+    """
+
+    def __init__(self, session, server, invocation_id, timeout, min_interval=2, max_interval=60):
+        self.session = session
+        self.server = server
+        self.invocation_id = invocation_id
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tracker = JobStateTracker(session, server)
+        self.state = None
+        self.steps = {}
+
+    def poll(self):
+        """
+        Fetch the invocation and its jobs. Returns true if anything changed.
+        """
+        invocation = galaxy_api.get_json(
+            self.session, f"{self.server}/api/invocations/{self.invocation_id}", step_details=True
+        )
+        changed = invocation["state"] != self.state
+        self.state = invocation["state"]
+        job_steps = {}
+        for step in invocation.get("steps", []):
+            self.steps[step["order_index"]] = step
+            for job in step.get("jobs") or []:
+                job_steps[job["id"]] = step["order_index"]
+            if step.get("job_id"):
+                job_steps[step["job_id"]] = step["order_index"]
+        jobs = galaxy_api.get_json(
+            self.session, f"{self.server}/api/jobs", invocation_id=self.invocation_id, limit=10000
+        )
+        return self.tracker.observe(jobs, job_steps) or changed
+
+    @property
+    def finished(self):
+        if self.state in FAILED_INVOCATION_STATES:
+            return True
+        return self.state in SCHEDULED_INVOCATION_STATES and self.tracker.all_finished
+
+    def wait(self):
+        """
+        Poll until the invocation has finished, backing off while nothing
+        changes and polling quickly again after every change.
+        """
+        deadline = time.monotonic() + self.timeout
+        interval = self.min_interval
+        while True:
+            changed = self.poll()
+            if self.finished:
+                return self.state
+            # poll quickly again after a change, to time the next transition closely
+            interval = self.min_interval if changed else min(interval * 1.5, self.max_interval)
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Invocation {self.invocation_id} did not finish within {self.timeout}s")
+            time.sleep(interval)
+
+    def records(self):
+        """
+        Return a (measurement, tags, fields) point per job and per step
+        """
+        records = []
+        by_step = {}
+        for record in self.tracker.jobs.values():
+            by_step.setdefault(record.step, []).append(record)
+            records.append(
+                (
+                    "workflow_invocation_job",
+                    {"step": record.step, "tool_id": record.tool_id, "job_id": record.job_id, "state": record.state},
+                    record.fields(),
+                )
+            )
+        for step, step_jobs in sorted(by_step.items(), key=lambda item: (item[0] is None, item[0])):
+            queued = [job.queued_at for job in step_jobs if job.queued_at]
+            running = [job.running_at for job in step_jobs if job.running_at]
+            finished = [job.finished_at for job in step_jobs if job.finished_at]
+            records.append(
+                (
+                    "workflow_invocation_step",
+                    {"step": step, "tool_id": step_jobs[0].tool_id},
+                    {
+                        "jobs": len(step_jobs),
+                        "failed_jobs": len([job for job in step_jobs if job.state != "ok"]),
+                        "queue_seconds": min(running) - min(queued) if running and queued else None,
+                        "run_seconds": max(finished) - min(running) if finished and running else None,
+                        "total_seconds": max(finished) - min(queued) if finished and queued else None,
+                    },
+                )
+            )
+        return records
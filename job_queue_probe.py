@@ -0,0 +1,338 @@
+"""
+Lightweight probe of the job system, which submits a trivial tool job (or K
+at once) through the Galaxy API and follows it through new, queued, running
+and ok. A run takes about a minute instead of the hours of a full workflow,
+and splits the wait into time before a handler picked the job up, time
+queued for its destination and time running, along with the handler and
+destination it was given.
+
+Each target is a tool id, optionally followed by tool inputs in query string
+form, so that jobs can be routed to different destinations through job
+resource parameters, e.g.
+
+cat1
+cat1?__job_resource|__job_resource__select=yes&__job_resource|destination=pulsar
+"""
+import concurrent.futures
+import sys
+import time
+from urllib.parse import parse_qsl
+
+import requests
+
+import galaxy_api
+from invocation_monitor import JobStateTracker
+from output_sinks import add_sink_arguments
+from probe_base import ProbeBase, create_probe_parser, probe_main, run_probe
+from timing import clock_action
+from tus_upload import wait_for_upload_job
+
+PROBE_HISTORY_NAME = "page_perf_job_queue_probe"
+DEFAULT_TARGETS = ("cat1",)
+
+
+class JobTarget(object):
+    def __init__(self, spec, input_name="input1"):
+        self.spec = spec
+        tool_id, _, query = spec.partition("?")
+        self.tool_id = tool_id
+        self.inputs = dict(parse_qsl(query))
+        # the tool input given the probe's dataset
+        self.input_name = input_name
+
+    def payload(self, history_id, dataset_id):
+        inputs = {}
+        if self.input_name:
+            inputs[self.input_name] = {"src": "hda", "id": dataset_id}
+        inputs.update(self.inputs)
+        return {"tool_id": self.tool_id, "history_id": history_id, "inputs": inputs}
+
+
+class ProbeJob(object):
+    def __init__(self, target, index, submitted_at, submit_seconds, response):
+        self.target = target
+        self.index = index
+        # unix time at which the job was submitted, and the time the request took
+        self.submitted_at = submitted_at
+        self.submit_seconds = submit_seconds
+        self.job_id = response["jobs"][0]["id"]
+        self.output_ids = [output["id"] for output in response.get("outputs", [])]
+        self.handler = None
+        self.destination = None
+
+    def placement_tags(self):
+        """
+        The handler and destination of the job, leaving out those that are
+        unknown, as only admins can see them for some jobs
+        """
+        tags = {"handler": self.handler, "destination": self.destination}
+        return {key: value for key, value in tags.items() if value is not None}
+
+    def fields(self, record):
+        """
+        Time spent in each state, measured on this machine's clock so that
+        server clock skew does not leak in. Transitions that happened
+        between two polls are attributed to the poll that saw them, and a
+        state that was skipped between polls has no time of its own.
+        """
+        created = self.submitted_at + self.submit_seconds
+        queued = record.first_seen.get("queued")
+        running = record.first_seen.get("running")
+        finished = record.first_seen.get(record.state) if record.finished else None
+        return {
+            "submit_seconds": self.submit_seconds,
+            "new_seconds": queued - created if queued else None,
+            "queued_seconds": running - queued if running and queued else None,
+            "wait_seconds": running - created if running else None,
+            "run_seconds": finished - running if finished and running else None,
+            "total_seconds": finished - self.submitted_at if finished else None,
+            "runtime_seconds": record.metrics.get("runtime_seconds"),
+        }
+
+
+class JobQueueProbe(ProbeBase):
+    """
+    Example usage:
+
+    probe = JobQueueProbe(server, username, password, targets=[JobTarget("cat1")], jobs_per_target=4, sink=sink)
+    probe.measure_timings()
+    """
+
+    mode = "job_queue"
+
+    def __init__(
+        self, server, username, password, targets, jobs_per_target=1, run_id=None, category=None,
+        session=None, sink=None, span_tree=False, timeout=3600, interval=1,
+    ):
+        super().__init__(
+            server, username, password, run_id=run_id, category=category, session=session, sink=sink,
+            span_tree=span_tree,
+        )
+        self.targets = targets
+        self.jobs_per_target = jobs_per_target
+        self.timeout = timeout
+        self.interval = interval
+        self.history_id = None
+        self.dataset_id = None
+
+    def ensure_history(self):
+        """
+        Find or create the probe's history, with one small dataset for the
+        probe jobs to read. Both are kept between runs.
+        """
+        if "x-api-key" not in self.session.headers:
+            galaxy_api.login(self.session, self.server, self.username, self.password)
+        histories = self.get("/api/histories", q="name", qv=PROBE_HISTORY_NAME, keys="id")
+        if histories:
+            self.history_id = histories[0]["id"]
+        else:
+            self.history_id = self.post("/api/histories", {"name": PROBE_HISTORY_NAME})["id"]
+        datasets = self.get(
+            f"/api/histories/{self.history_id}/contents",
+            v="dev",
+            order="hid-asc",
+            limit=1,
+            q=["deleted", "visible", "state"],
+            qv=["false", "true", "ok"],
+        )
+        if datasets:
+            self.dataset_id = datasets[0]["id"]
+            return
+        response = self.post(
+            "/api/tools/fetch",
+            {
+                "history_id": self.history_id,
+                "targets": [
+                    {
+                        "destination": {"type": "hdas"},
+                        "elements": [
+                            {"src": "pasted", "paste_content": "page perf job queue probe\n", "ext": "txt", "name": "probe.txt"}
+                        ],
+                    }
+                ],
+            },
+        )
+        _, dataset = wait_for_upload_job(self.session, self.server, response, self.timeout)
+        if dataset.get("state") != "ok":
+            raise ValueError(f"Probe dataset is {dataset.get('state')}, not ok")
+        self.dataset_id = dataset["id"]
+
+    def submit(self, target, index):
+        payload = target.payload(self.history_id, self.dataset_id)
+        submitted_at = time.time()
+        start = time.perf_counter()
+        response = self.post("/api/tools", payload)
+        return ProbeJob(target, index, submitted_at, time.perf_counter() - start, response)
+
+    def submit_all(self):
+        """
+        Submit jobs_per_target jobs for every target at once
+        """
+        requests_to_make = [(target, index) for target in self.targets for index in range(self.jobs_per_target)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(requests_to_make)) as executor:
+            futures = [executor.submit(self.submit, target, index) for target, index in requests_to_make]
+            return [future.result() for future in futures]
+
+    def fetch_placement(self, job):
+        """
+        Record the handler and destination of a job, from the job itself or,
+        for admins, from its destination parameters
+        """
+        details = self.get(f"/api/jobs/{job.job_id}", full=True)
+        job.handler = details.get("handler")
+        job.destination = details.get("destination_id") or details.get("job_runner_name")
+        if job.handler and job.destination:
+            return
+        try:
+            params = self.get(f"/api/jobs/{job.job_id}/destination_params")
+        except requests.RequestException:
+            # only admins can see where a job was sent
+            return
+        job.handler = job.handler or params.get("Handler")
+        job.destination = job.destination or params.get("Runner")
+
+    def wait(self, jobs, tracker):
+        """
+        Poll every job until all have finished, at a fixed short interval
+        so that each transition is timed to within it
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pending = [
+                job for job in jobs if job.job_id not in tracker.jobs or not tracker.jobs[job.job_id].finished
+            ]
+            tracker.observe([self.get(f"/api/jobs/{job.job_id}") for job in pending])
+            if tracker.all_finished:
+                return
+            if time.monotonic() + self.interval > deadline:
+                raise TimeoutError(f"Probe jobs did not finish within {self.timeout}s")
+            time.sleep(self.interval)
+
+    def clean_up(self, jobs):
+        """
+        Purge the probe jobs' outputs, so that the history does not grow
+        with every run
+        """
+        for job in jobs:
+            for output_id in job.output_ids:
+                try:
+                    response = self.session.delete(
+                        f"{self.server}/api/histories/{self.history_id}/contents/{output_id}",
+                        # older releases read purge from the body, newer ones from the query
+                        params={"purge": True},
+                        json={"purge": True},
+                        timeout=galaxy_api.REQUEST_TIMEOUT,
+                    )
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"Could not purge probe output {output_id}: {e}", file=sys.stderr)
+
+    @clock_action("job_queue_probe")
+    def probe_job_queue(self):
+        with self.spans.span("setup"):
+            self.ensure_history()
+        with self.spans.span("submit", jobs=len(self.targets) * self.jobs_per_target):
+            jobs = self.submit_all()
+        try:
+            with self.spans.span("wait", jobs=len(jobs)) as span:
+                tracker = JobStateTracker(self.session, self.server)
+                try:
+                    self.wait(jobs, tracker)
+                finally:
+                    for job in jobs:
+                        record = tracker.jobs.get(job.job_id)
+                        if not record:
+                            continue
+                        try:
+                            self.fetch_placement(job)
+                        except requests.RequestException as e:
+                            print(f"Could not fetch the placement of job {job.job_id}: {e}", file=sys.stderr)
+                        span.add_record(
+                            "job_queue_latency",
+                            job.fields(record),
+                            target=job.target.spec,
+                            tool_id=job.target.tool_id,
+                            job_index=job.index,
+                            job_id=job.job_id,
+                            state=record.state,
+                            **job.placement_tags(),
+                        )
+        finally:
+            self.clean_up(jobs)
+
+    def run_test_sequence(self):
+        self.probe_job_queue()
+
+
+def run_job_queue_probe(args, sink):
+    """
+    Run the probe once, or every args.interval seconds in daemon mode,
+    reusing the same session, and so the same API key, for every run.
+    """
+    targets = [JobTarget(spec, args.job_probe_input) for spec in args.job_probe_targets]
+    run_probe(
+        args,
+        lambda run_id, session: JobQueueProbe(
+            args.server,
+            args.username,
+            args.password,
+            targets,
+            jobs_per_target=args.job_probe_jobs,
+            run_id=run_id,
+            category=args.category,
+            session=session,
+            sink=sink,
+            span_tree=args.span_tree,
+            timeout=args.job_probe_timeout,
+            interval=args.job_probe_poll_interval,
+        ),
+    )
+
+
+def add_job_probe_arguments(parser):
+    parser.add_argument(
+        "--job_probe_targets",
+        nargs="+",
+        default=list(DEFAULT_TARGETS),
+        help="Tools to submit probe jobs to, each a tool id optionally followed by tool inputs as a query string, e.g. 'cat1?__job_resource|__job_resource__select=yes&__job_resource|destination=pulsar'. Defaults to cat1",
+    )
+    parser.add_argument(
+        "--job_probe_jobs",
+        type=int,
+        default=1,
+        help="Number of jobs to submit at once to each target. Defaults to 1",
+    )
+    parser.add_argument(
+        "--job_probe_input",
+        default="input1",
+        help="Name of the tool input that is given the probe's dataset, or an empty string for tools without one. Defaults to input1",
+    )
+    parser.add_argument(
+        "--job_probe_poll_interval",
+        type=float,
+        default=1,
+        help="Seconds between polls of the probe jobs' states, which bounds how closely each transition is timed. Defaults to 1",
+    )
+    parser.add_argument(
+        "--job_probe_timeout",
+        type=float,
+        default=3600,
+        help="Seconds to wait for the probe jobs to finish. Defaults to 3600",
+    )
+
+
+def create_parser():
+    parser = create_probe_parser(
+        "Measure how long trivial jobs take to be picked up, queued and run by Galaxy's job system."
+    )
+    add_job_probe_arguments(parser)
+    add_sink_arguments(parser)
+    return parser
+
+
+def main():
+    return probe_main(create_parser(), run_job_queue_probe)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
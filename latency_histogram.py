@@ -0,0 +1,90 @@
+"""
+Streaming latency histogram, in the style of an HDR histogram: samples are
+counted in logarithmically sized buckets, so memory use depends only on the
+range of values seen, and any quantile is accurate to within a fixed
+relative error.
+"""
+import math
+
+QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+class LatencyHistogram(object):
+    """
+    Example usage:
+
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    histogram.quantile(0.99)
+    """
+
+    def __init__(self, relative_error=0.01):
+        self.relative_error = relative_error
+        self.base = math.log1p(2 * relative_error)
+        # bucket index -> count
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+
+    def bucket(self, value):
+        return math.floor(math.log(value) / self.base)
+
+    def bucket_value(self, index):
+        # midpoint of the bucket, which is within relative_error of any value in it
+        lower = math.exp(index * self.base)
+        upper = math.exp((index + 1) * self.base)
+        return (lower + upper) / 2
+
+    def record(self, value):
+        if value < 0:
+            raise ValueError(f"Negative latency: {value}")
+        if value == 0:
+            self.zero_count += 1
+        else:
+            index = self.bucket(value)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        # nearest rank, counting from 1
+        rank = max(1, math.ceil(q * self.count))
+        seen = self.zero_count
+        if rank <= seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank <= seen:
+                # never report a value outside of the range actually seen
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def summary_fields(self):
+        fields = {
+            "count": self.count,
+            "min": self.min,
+            "mean": self.sum / self.count if self.count else None,
+        }
+        for name, q in QUANTILES:
+            fields[name] = self.quantile(q)
+        fields["max"] = self.max
+        return fields
@@ -0,0 +1,123 @@
+"""
+Helpers for formatting measurements in the influxdb line protocol.
+"""
+from latency_histogram import LatencyHistogram
+
+
+def escape_tag(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(",", "\\,")
+        .replace("=", "\\=")
+        .replace(" ", "\\ ")
+    )
+
+
+def format_field(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        # Always write numbers as floats, so that a field never changes type
+        return str(float(value))
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def format_line(measurement, tags, fields, timestamp=None):
+    """
+    Format a single point. Tags with empty or None values and fields with
+    None values are left out, as influxdb does not accept them. A point
+    left with no fields is not valid at all, and None is returned for it.
+    """
+    tag_str = "".join(
+        f",{key}={escape_tag(value)}" for key, value in tags.items() if value is not None and value != ""
+    )
+    field_str = ",".join(
+        f"{key}={format_field(value)}" for key, value in fields.items() if value is not None
+    )
+    if not field_str:
+        return None
+    line = f"{measurement}{tag_str} {field_str}"
+    if timestamp is not None:
+        line += f" {timestamp}"
+    return line
+
+
+def format_spans(spans, line_tags, span_tree=False):
+    """
+    Format the top level steps of a SpanTimer, and any extra points recorded
+    for them. line_tags is called with each step's name to get its tags.
+    If span_tree is set, every nested span is also emitted as a
+    user_flow_span point, with its path from the top level step.
+    """
+    lines = []
+    for root in spans.roots:
+        lines.extend(format_step(root, line_tags(root.name), span_tree))
+    return lines
+
+
+def format_step(root, tags, span_tree=False):
+    """
+    Format a single top level step, see format_spans
+    """
+    tags = dict(tags, **root.tags)
+    lines = []
+    if not root.failed:
+        lines.append(
+            format_line(
+                "user_flow_performance", tags, dict(time_taken=root.elapsed, **root.fields), root.end_timestamp
+            )
+        )
+    if span_tree:
+        for span in root.walk():
+            fields = {
+                "time_taken": span.elapsed,
+                "offset": (span.start_ns - root.start_ns) / 1e9,
+                "failed": span.failed,
+            }
+            fields.update(span.fields)
+            fields.update(
+                (key, value) for key, value in span.attributes.items() if isinstance(value, (int, float))
+            )
+            lines.append(
+                format_line(
+                    "user_flow_span",
+                    dict(tags, span=span.path, depth=span.depth),
+                    fields,
+                    span.end_timestamp,
+                )
+            )
+    for span in root.walk():
+        for measurement, extra_tags, fields in span.records:
+            line = format_line(measurement, dict(tags, **extra_tags), fields, span.end_timestamp)
+            # e.g. a job seen only once, with no time in any state yet
+            if line:
+                lines.append(line)
+    return lines
+
+
+def format_summaries(spans, line_tags, **extra_tags):
+    """
+    Format a user_flow_summary point for each top level step that completed
+    more than once, with the distribution of its time taken.
+    """
+    histograms = {}
+    timestamps = {}
+    for root in spans.roots:
+        if root.failed:
+            continue
+        # steps with different tags, such as cache=cold and cache=warm, are summarised separately
+        key = (root.name, tuple(sorted(root.tags.items())))
+        histograms.setdefault(key, LatencyHistogram()).record(root.elapsed)
+        timestamps[key] = root.end_timestamp
+    return [
+        format_line(
+            "user_flow_summary",
+            dict(line_tags(name), **dict(tags), **extra_tags),
+            histogram.summary_fields(),
+            timestamps[(name, tags)],
+        )
+        for (name, tags), histogram in histograms.items()
+        if histogram.count > 1
+    ]
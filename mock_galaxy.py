@@ -0,0 +1,328 @@
+"""
+Local mock of the Galaxy pages used by the user flow, for measuring the
+timer's own overhead without any network. Every element the flow waits on
+is added to the page after a fixed, configurable delay, so the time a step
+should take is known exactly.
+
+The mock covers the flow up to workflow_run_page_load. It can also be run
+on its own, to try out other modes offline:
+
+python mock_galaxy.py --port 8080
+"""
+import argparse
+import html
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+# Seconds after page load (or after the user action that triggers them) at
+# which each awaited element is added to the page
+DEFAULT_DELAYS = {
+    "login_form": 0.5,
+    "tool_search": 0.3,
+    "tool_panel": 0.8,
+    "tool_search_results": 0.4,
+    "tool_form": 0.6,
+    "histories_list": 0.5,
+    "history_panel": 0.4,
+    "history_view": 0.5,
+    "history_copy": 0.7,
+    "workflow_list": 0.5,
+    "workflow_run_form": 0.9,
+}
+
+TOOLS = [
+    {"id": "toolshed.g2.bx.psu.edu/repos/devteam/bwa/bwa/0.7.17.5", "name": "Map with BWA"},
+    {"id": "toolshed.g2.bx.psu.edu/repos/devteam/bwa/bwa_mem/0.7.17.2", "name": "Map with BWA-MEM"},
+    {"id": "toolshed.g2.bx.psu.edu/repos/devteam/fastqc/fastqc/0.74", "name": "FastQC"},
+    {"id": "Cut1", "name": "Cut columns from a table"},
+]
+
+WORKFLOW_NAMES = [f"Selenium_test_{index}" for index in range(1, 8)]
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Mock Galaxy</title></head>
+<body>
+{body}
+<script>
+for (const template of document.querySelectorAll('template[data-delay]')) {{
+    setTimeout(() => template.replaceWith(template.content.cloneNode(true)), template.dataset.delay * 1000);
+}}
+{script}
+</script>
+</body>
+</html>
+"""
+
+TOOL_SEARCH_SCRIPT = """
+const tools = %s;
+document.addEventListener('input', event => {
+    if (event.target.id !== 'tool-search') {
+        return;
+    }
+    const results = document.getElementById('tool-results');
+    const query = event.target.value.toLowerCase();
+    clearTimeout(window.searchTimer);
+    results.innerHTML = '';
+    if (!query) {
+        return;
+    }
+    window.searchTimer = setTimeout(() => {
+        results.innerHTML = tools
+            .filter(tool => tool.name.toLowerCase().includes(query) || tool.id.toLowerCase().includes(query))
+            .map(tool => `<a href="/tool_runner?tool_id=${encodeURIComponent(tool.id)}">${tool.name}</a>`)
+            .join('');
+    }, %s);
+});
+"""
+
+TOOL_FORM_SCRIPT = """
+fetch(`/api/tools/${encodeURIComponent(%s)}/build`).then(() => setTimeout(() => {
+    document.getElementById('tool-form').innerHTML = '<button id="execute">Run Tool</button>';
+}, %s));
+"""
+
+HISTORIES_SCRIPT = """
+document.addEventListener('click', event => {
+    if (event.target.classList.contains('history-name')) {
+        event.target.nextElementSibling.style.display = 'block';
+    } else if (event.target.dataset.href) {
+        location.href = event.target.dataset.href;
+    }
+});
+"""
+
+HISTORY_VIEW_SCRIPT = """
+document.addEventListener('click', event => {
+    if (event.target.title === 'Import this history') {
+        document.getElementById('copy-modal').style.display = 'block';
+    } else if (event.target.id === 'copy-history') {
+        const name = document.getElementById('copy-modal-title').value;
+        document.cookie = `current_history=${encodeURIComponent(name)}; path=/`;
+        setTimeout(() => {
+            document.getElementById('copy-result').innerHTML =
+                '<div class="alert alert-info">History imported and is now your active history</div>';
+        }, %s);
+    }
+});
+"""
+
+WORKFLOW_LIST_SCRIPT = """
+document.addEventListener('input', event => {
+    if (!event.target.closest('#workflow-list-filter')) {
+        return;
+    }
+    const query = event.target.value.toLowerCase();
+    const cards = document.getElementById('workflow-cards');
+    cards.cards = cards.cards || Array.from(cards.children);
+    cards.replaceChildren(...cards.cards.filter(card => card.dataset.name.includes(query)));
+});
+document.addEventListener('click', event => {
+    if (event.target.dataset.href) {
+        location.href = event.target.dataset.href;
+    }
+});
+"""
+
+
+class MockGalaxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def delays(self):
+        return self.server.delays
+
+    def delayed(self, key, markup):
+        return f'<template data-delay="{self.delays[key]}">{markup}</template>'
+
+    def cookies(self):
+        cookies = {}
+        for cookie in self.headers.get("Cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            cookies[name] = unquote(value)
+        return cookies
+
+    def send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, body, script=""):
+        self.send(200, PAGE.format(body=body, script=script))
+
+    def send_json(self, data):
+        self.send(200, json.dumps(data), content_type="application/json")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlsplit(self.path).path == "/user/login":
+            self.send(302, "", headers={"Location": "/", "Set-Cookie": "galaxysession=mock; path=/"})
+        else:
+            self.send(404, "Not found")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path
+        if path == "/login":
+            self.send_page(
+                self.delayed(
+                    "login_form",
+                    '<form method="post" action="/user/login">'
+                    '<input name="login"><input name="password" type="password">'
+                    '<button type="submit">Login</button></form>',
+                )
+            )
+        elif path == "/":
+            self.send_page(
+                self.delayed("tool_search", '<input id="tool-search" placeholder="search tools">')
+                + self.delayed(
+                    "tool_panel", '<div class="tool-panel-section"><a class="title-link" href="#">Get Data</a></div>'
+                )
+                + '<div id="tool-results"></div>',
+                TOOL_SEARCH_SCRIPT % (json.dumps(TOOLS), self.delays["tool_search_results"] * 1000),
+            )
+        elif path == "/tool_runner":
+            self.send_page(
+                '<div id="tool-form"></div>',
+                TOOL_FORM_SCRIPT % (json.dumps(params.get("tool_id", "")), self.delays["tool_form"] * 1000),
+            )
+        elif path == "/histories/list_published":
+            rows = "".join(
+                f'<tr><td><button class="history-name">{name}_input_data</button>'
+                f'<div style="display: none"><button data-description="grid operation view" '
+                f'data-href="/histories/view?name={quote(name)}_input_data">View</button></div></td></tr>'
+                for name in WORKFLOW_NAMES
+            )
+            self.send_page(
+                self.delayed(
+                    "histories_list",
+                    '<ul><li id="histories-published-tab">Public Histories</li></ul>'
+                    '<div id="histories-published-grid"><input placeholder="search histories"></div>'
+                    f'<table class="grid-table">{rows}</table>',
+                )
+                + self.delayed("history_panel", "<div><nav><h2>History</h2></nav></div>"),
+                HISTORIES_SCRIPT,
+            )
+        elif path == "/histories/view":
+            self.send_page(
+                self.delayed(
+                    "history_view",
+                    f'<h3>{html.escape(params.get("name", ""))}</h3>'
+                    '<button title="Import this history">Import this history</button>',
+                )
+                + '<div id="copy-modal" style="display: none"><input id="copy-modal-title">'
+                '<button id="copy-history">Copy History</button></div><div id="copy-result"></div>',
+                HISTORY_VIEW_SCRIPT % (self.delays["history_copy"] * 1000),
+            )
+        elif path == "/histories/list":
+            name = html.escape(self.cookies().get("current_history", "Unnamed history"))
+            self.send_page(self.delayed("history_panel", f'<div id="current-history-panel"><h3>{name}</h3></div>'))
+        elif path == "/workflows/list_published":
+            cards = "".join(
+                f'<div class="workflow-card" data-name="{name.lower()}"><span>{name}</span>'
+                f'<button id="workflow-run-button" data-href="/workflows/run?id={index}">Run</button></div>'
+                for index, name in enumerate(WORKFLOW_NAMES)
+            )
+            self.send_page(
+                self.delayed(
+                    "workflow_list",
+                    '<ul><li id="published">Public workflows</li></ul>'
+                    '<div id="workflow-list-filter"><input></div>'
+                    f'<div id="workflow-cards">{cards}</div>',
+                ),
+                WORKFLOW_LIST_SCRIPT,
+            )
+        elif path == "/workflows/run":
+            self.send_page(self.delayed("workflow_run_form", '<button id="run-workflow">Run Workflow</button>'))
+        elif path == "/api/version":
+            self.send_json({"version_major": "mock"})
+        elif path == "/api/users/current":
+            self.send_json({"id": "mock"} if self.cookies().get("galaxysession") else {})
+        elif path == "/api/tools":
+            query = params.get("q", "").lower()
+            self.send_json(
+                [tool["id"] for tool in TOOLS if query in tool["name"].lower() or query in tool["id"].lower()]
+            )
+        elif path.startswith("/api/tools/") and path.endswith("/build"):
+            self.send_json({})
+        else:
+            self.send(404, "Not found")
+
+
+class MockGalaxy(object):
+    """
+    Example usage:
+
+    mock = MockGalaxy(delays={"tool_form": 2})
+    mock.start()
+    timer = PagePerfTimer(mock.url, "user", "password")
+    ...
+    mock.stop()
+    """
+
+    def __init__(self, delays=None, host="127.0.0.1", port=0):
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.server = ThreadingHTTPServer((host, port), MockGalaxyHandler)
+        self.server.daemon_threads = True
+        self.server.delays = self.delays
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-galaxy", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def injected_delay(self, action):
+        """
+        The time a step would take if the timer and the mock added nothing,
+        or None for steps the mock does not cover
+        """
+        delays = self.delays
+        return {
+            "login_page_load": delays["login_form"],
+            "home_page_load": max(delays["tool_search"], delays["tool_panel"]),
+            "tool_search_load": delays["tool_search_results"],
+            "tool_form_load": delays["tool_form"],
+            "published_histories_page_load": max(delays["histories_list"], delays["history_panel"]),
+            "import_published_history": delays["history_view"] + delays["history_copy"] + delays["history_panel"],
+            "workflow_list_page_load": delays["workflow_list"],
+            "workflow_run_page_load": delays["workflow_run_form"],
+        }.get(action)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock Galaxy pages with fixed delays, for testing the timer.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Defaults to 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on. Defaults to 8080")
+    args = parser.parse_args()
+    mock = MockGalaxy(host=args.host, port=args.port)
+    print(f"Serving mock Galaxy at {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
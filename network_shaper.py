@@ -0,0 +1,260 @@
+"""
+In-process forwarding proxy that shapes the browser's traffic to emulate a
+slow user link, with added round trip time, jitter, bandwidth caps and the
+delays caused by packet loss.
+
+Both plain HTTP requests and CONNECT tunnels (for HTTPS) are forwarded.
+Data is delayed by half the round trip time in each direction, and new
+connections pay one more round trip for the TCP handshake, so that every
+round trip a page load makes to the server costs what it would over the
+emulated link. Loss is emulated by holding back a chunk of data for a
+retransmission timeout, since dropping data is not possible above TCP.
+"""
+import copy
+import queue
+import random
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlsplit
+
+RECV_SIZE = 16 * 1024
+MAX_HEAD_SIZE = 64 * 1024
+CONNECT_TIMEOUT = 30
+# minimum time before TCP retransmits a lost segment
+MIN_RTO = 0.2
+
+
+class ShapingProfile(object):
+    def __init__(self, name, rtt=0.0, down_kbps=None, up_kbps=None, jitter=0.0, loss=0.0):
+        self.name = name
+        # added round trip time, in seconds
+        self.rtt = rtt
+        # bandwidth caps, in kbit/s, or None for no cap
+        self.down_kbps = down_kbps
+        self.up_kbps = up_kbps
+        # maximum random variation of each one way delay, in seconds
+        self.jitter = jitter
+        # probability of each chunk of data being lost and retransmitted
+        self.loss = loss
+
+    def one_way_delay(self):
+        delay = self.rtt / 2 + random.uniform(-self.jitter, self.jitter)
+        if self.loss and random.random() < self.loss:
+            delay += max(MIN_RTO, 2 * self.rtt)
+        return max(0.0, delay)
+
+
+PROFILES = {
+    "custom": ShapingProfile("custom"),
+    "regional": ShapingProfile("regional", rtt=0.06, down_kbps=20000, up_kbps=5000, jitter=0.005),
+    "intercontinental": ShapingProfile("intercontinental", rtt=0.3, jitter=0.01),
+    "3g": ShapingProfile("3g", rtt=0.3, down_kbps=1600, up_kbps=768, jitter=0.03),
+    "lossy": ShapingProfile("lossy", rtt=0.1, jitter=0.02, loss=0.02),
+}
+
+
+def get_network_profile(args):
+    """
+    Return the profile selected by --network_profile, with any of the
+    individual shaping options applied to it, or None if not shaping
+    """
+    if not args.network_profile:
+        return None
+    profile = copy.copy(PROFILES[args.network_profile])
+    for key in ("rtt", "down_kbps", "up_kbps", "jitter", "loss"):
+        value = getattr(args, f"network_{key}")
+        if value is not None:
+            setattr(profile, key, value)
+    return profile
+
+
+class Pacer(object):
+    """
+    Paces data to a fixed rate, shared by all connections sending in the
+    same direction, like a single link
+    """
+
+    def __init__(self, kbps):
+        self.bytes_per_sec = kbps * 1000 / 8 if kbps else None
+        self.lock = threading.Lock()
+        self.next_free = 0.0
+
+    def wait(self, size):
+        if not self.bytes_per_sec:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self.next_free)
+            self.next_free = start + size / self.bytes_per_sec
+            done = self.next_free
+        time.sleep(max(0.0, done - time.monotonic()))
+
+
+class DelayLine(object):
+    """
+    Forwards data from one socket to another, delaying each chunk by the
+    profile's one way delay and pacing it to the direction's bandwidth.
+    Chunks are never reordered.
+    """
+
+    def __init__(self, profile, pacer, source, destination, initial=b""):
+        self.profile = profile
+        self.pacer = pacer
+        self.source = source
+        self.destination = destination
+        self.chunks = queue.Queue()
+        self.last_release = 0.0
+        if initial:
+            self.put(initial)
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.writer = threading.Thread(target=self.write, daemon=True)
+
+    def start(self):
+        self.reader.start()
+        self.writer.start()
+
+    def put(self, data):
+        self.last_release = max(self.last_release, time.monotonic() + self.profile.one_way_delay())
+        self.chunks.put((self.last_release, data))
+
+    def read(self):
+        try:
+            while True:
+                data = self.source.recv(RECV_SIZE)
+                if not data:
+                    break
+                self.put(data)
+        except OSError:
+            pass
+        self.put(None)
+
+    def write(self):
+        try:
+            while True:
+                release, data = self.chunks.get()
+                time.sleep(max(0.0, release - time.monotonic()))
+                if data is None:
+                    self.destination.shutdown(socket.SHUT_WR)
+                    return
+                self.pacer.wait(len(data))
+                self.destination.sendall(data)
+        except OSError:
+            # the other side has gone away, so stop reading too
+            close_quietly(self.source)
+
+    def join(self):
+        self.writer.join()
+
+
+def close_quietly(sock):
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def read_head(sock):
+    """
+    Read a request head. Returns the head, and any bytes read past it.
+    """
+    buffer = b""
+    while b"\r\n\r\n" not in buffer:
+        data = sock.recv(RECV_SIZE)
+        if not data or len(buffer) > MAX_HEAD_SIZE:
+            return None, b""
+        buffer += data
+    head, _, rest = buffer.partition(b"\r\n\r\n")
+    return head, rest
+
+
+class ShapingProxyHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        client = self.request
+        head, rest = read_head(client)
+        if not head:
+            return
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+        profile = self.server.profile
+        if method == "CONNECT":
+            host, port = target.rsplit(":", 1)
+            upstream = self.connect(host.strip("[]"), int(port))
+            if not upstream:
+                return
+            client.sendall(f"{version} 200 Connection established\r\n\r\n".encode("latin-1"))
+            initial = rest
+        else:
+            url = urlsplit(target)
+            upstream = self.connect(url.hostname, url.port or 80)
+            if not upstream:
+                return
+            path = url.path or "/"
+            if url.query:
+                path += f"?{url.query}"
+            # one request per connection, as the next may be for another server
+            headers = [
+                line for line in lines[1:]
+                if line.split(":", 1)[0].strip().lower() not in ("connection", "proxy-connection", "keep-alive")
+            ]
+            headers.append("Connection: close")
+            initial = "\r\n".join([f"{method} {path} {version}"] + headers + ["", ""]).encode("latin-1") + rest
+        self.pipe(profile, client, upstream, initial)
+
+    def connect(self, host, port):
+        try:
+            upstream = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+        except OSError:
+            self.request.sendall(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            return None
+        upstream.settimeout(None)
+        # the TCP handshake over the emulated link
+        time.sleep(self.server.profile.rtt)
+        return upstream
+
+    def pipe(self, profile, client, upstream, initial):
+        lines = [
+            DelayLine(profile, self.server.up, client, upstream, initial),
+            DelayLine(profile, self.server.down, upstream, client),
+        ]
+        for line in lines:
+            line.start()
+        for line in lines:
+            line.join()
+        close_quietly(upstream)
+
+
+class ShapingProxyServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class NetworkShaper(object):
+    """
+    Example usage:
+
+    shaper = NetworkShaper(PROFILES["3g"])
+    shaper.start()
+    host, port = shaper.address
+    ...
+    shaper.stop()
+    """
+
+    def __init__(self, profile, host="127.0.0.1", port=0):
+        self.profile = profile
+        self.server = ShapingProxyServer((host, port), ShapingProxyHandler, bind_and_activate=True)
+        self.server.profile = profile
+        self.server.up = Pacer(profile.up_kbps)
+        self.server.down = Pacer(profile.down_kbps)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="network-shaper", daemon=True)
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
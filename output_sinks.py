@@ -0,0 +1,274 @@
+"""
+Output sinks for line protocol points. Points are written to a sink as soon
+as each step is clocked, so that a run which is killed part way through
+still reports the steps it completed.
+
+StdoutSink prints points, and is the default. InfluxSink batches points and
+writes them gzipped to an InfluxDB v1 or v2 write endpoint, appending any
+batch it cannot deliver to an on-disk spool, which is replayed once the
+endpoint is reachable again.
+"""
+import gzip
+import os
+import sys
+import threading
+
+import requests
+
+import galaxy_api
+from line_protocol import format_step
+
+
+class StdoutSink(object):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def write(self, lines):
+        with self.lock:
+            for line in lines:
+                print(line, file=self.stream)
+            self.stream.flush()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InfluxSink(object):
+    """
+    Example usage:
+
+    sink = InfluxSink("http://localhost:8086", bucket="galaxy", org="galaxy-au", token=token)
+    sink.write(lines)
+    ...
+    sink.close()
+
+    Pass database (and optionally username and password) instead of bucket,
+    org and token to write to InfluxDB 1.x. Points are sent in the
+    background every flush_interval seconds, or as soon as batch_size points
+    are waiting. Since a point is identified by its series and timestamp,
+    a batch that is replayed more than once is not duplicated in InfluxDB.
+    """
+
+    def __init__(
+        self, url, database=None, bucket=None, org=None, token=None, username=None, password=None,
+        batch_size=1000, flush_interval=10, spool_path="influx_spool.lp",
+    ):
+        url = url.rstrip("/")
+        if bucket:
+            self.write_url = f"{url}/api/v2/write"
+            self.params = {"bucket": bucket, "org": org, "precision": "ns"}
+        elif database:
+            self.write_url = f"{url}/write"
+            self.params = {"db": database, "u": username, "p": password, "precision": "ns"}
+        else:
+            raise ValueError("Either an InfluxDB 2 bucket or an InfluxDB 1 database is required")
+        self.session = galaxy_api.create_session(pool_size=1)
+        self.session.headers.update({"Content-Type": "text/plain; charset=utf-8", "Content-Encoding": "gzip"})
+        if token:
+            self.session.headers["Authorization"] = f"Token {token}"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)
+        # held while sending, so that batches and the spool are written in order
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="influx-sink", daemon=True)
+        self.thread.start()
+
+    def write(self, lines):
+        with self.pending:
+            self.buffer.extend(lines)
+            if len(self.buffer) >= self.batch_size:
+                self.pending.notify()
+
+    def run(self):
+        while True:
+            with self.pending:
+                if not self.closed and len(self.buffer) < self.batch_size:
+                    self.pending.wait(self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        with self.send_lock:
+            with self.lock:
+                lines, self.buffer = self.buffer, []
+            if not self.replay_spool():
+                self.spool(lines)
+                return
+            for start in range(0, len(lines), self.batch_size):
+                batch = lines[start:start + self.batch_size]
+                if not self.send(batch):
+                    self.spool(lines[start:])
+                    return
+
+    def send(self, lines):
+        """
+        Write a batch of points. Returns false if the batch should be spooled
+        and sent again later, which is anything but a success or a definite
+        rejection of the points (a 4xx other than 429).
+        """
+        if not lines:
+            return True
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        try:
+            response = self.session.post(
+                self.write_url, params=self.params, data=body, timeout=galaxy_api.REQUEST_TIMEOUT
+            )
+        except requests.RequestException as e:
+            print(f"Could not write to {self.write_url}: {e}", file=sys.stderr)
+            return False
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            # a rejected batch would be rejected again, so do not spool it
+            print(
+                f"InfluxDB rejected {len(lines)} points: HTTP {response.status_code} {response.text}", file=sys.stderr
+            )
+            return True
+        if not 200 <= response.status_code < 300:
+            # e.g. a server error, or a proxy redirecting while InfluxDB is down
+            print(f"Could not write to {self.write_url}: HTTP {response.status_code}", file=sys.stderr)
+            return False
+        return True
+
+    def spool(self, lines):
+        if not lines:
+            return
+        with open(self.spool_path, "a", encoding="utf-8") as spool_file:
+            spool_file.writelines(f"{line}\n" for line in lines)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+
+    def replay_spool(self):
+        """
+        Send any spooled points. Returns true once the spool is empty.
+        """
+        if not os.path.exists(self.spool_path):
+            return True
+        with open(self.spool_path, encoding="utf-8") as spool_file:
+            lines = [line.rstrip("\n") for line in spool_file if line.strip()]
+        for start in range(0, len(lines), self.batch_size):
+            if not self.send(lines[start:start + self.batch_size]):
+                # keep only what has not been sent yet
+                self.rewrite_spool(lines[start:])
+                return False
+        os.remove(self.spool_path)
+        return True
+
+    def rewrite_spool(self, lines):
+        temp_path = f"{self.spool_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as spool_file:
+            spool_file.writelines(f"{line}\n" for line in lines)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(temp_path, self.spool_path)
+
+    def close(self):
+        with self.pending:
+            self.closed = True
+            self.pending.notify()
+        self.thread.join()
+        self.flush()
+
+
+class StepWriter(object):
+    """
+    Writes each top level step of a SpanTimer to a sink once it has completed
+    """
+
+    def __init__(self, sink, line_tags, span_tree=False):
+        self.sink = sink
+        self.line_tags = line_tags
+        self.span_tree = span_tree
+        self.spans = None
+        self.written = 0
+
+    def write_completed(self, spans):
+        if spans is not self.spans:
+            self.spans = spans
+            self.written = 0
+        lines = []
+        for root in spans.roots[self.written:]:
+            if root.end_ns is None:
+                # still in progress
+                break
+            lines.extend(format_step(root, self.line_tags(root.name), self.span_tree))
+            self.written += 1
+        if lines:
+            self.sink.write(lines)
+
+
+def add_sink_arguments(parser):
+    parser.add_argument(
+        "--output",
+        choices=["stdout", "influx"],
+        default="stdout",
+        help="Where to write timings. Defaults to stdout",
+    )
+    parser.add_argument(
+        "--influx_url",
+        default=os.environ.get("INFLUX_URL"),
+        help="InfluxDB url, such as http://localhost:8086 (or set INFLUX_URL env var)",
+    )
+    parser.add_argument(
+        "--influx_bucket",
+        default=os.environ.get("INFLUX_BUCKET"),
+        help="InfluxDB 2 bucket to write to (or set INFLUX_BUCKET env var)",
+    )
+    parser.add_argument(
+        "--influx_org",
+        default=os.environ.get("INFLUX_ORG"),
+        help="InfluxDB 2 organisation (or set INFLUX_ORG env var)",
+    )
+    parser.add_argument(
+        "--influx_database",
+        default=os.environ.get("INFLUX_DATABASE"),
+        help="InfluxDB 1 database to write to, if no bucket is given (or set INFLUX_DATABASE env var)",
+    )
+    parser.add_argument(
+        "--influx_batch_size",
+        type=int,
+        default=1000,
+        help="Maximum number of points to send to InfluxDB at once. Defaults to 1000",
+    )
+    parser.add_argument(
+        "--influx_flush_interval",
+        type=float,
+        default=10,
+        help="Seconds between writes to InfluxDB. Defaults to 10",
+    )
+    parser.add_argument(
+        "--spool_path",
+        default=os.environ.get("INFLUX_SPOOL_PATH") or "influx_spool.lp",
+        help="File to keep points in while InfluxDB cannot be reached (or set INFLUX_SPOOL_PATH env var)",
+    )
+
+
+def create_sink(args):
+    """
+    Create the sink selected by add_sink_arguments' options. Credentials are
+    only read from the INFLUX_TOKEN, INFLUX_USERNAME and INFLUX_PASSWORD env vars.
+    """
+    if args.output == "stdout":
+        return StdoutSink()
+    if not args.influx_url:
+        raise ValueError("--influx_url is required for influx output")
+    return InfluxSink(
+        args.influx_url,
+        database=args.influx_database,
+        bucket=args.influx_bucket,
+        org=args.influx_org,
+        token=os.environ.get("INFLUX_TOKEN"),
+        username=os.environ.get("INFLUX_USERNAME"),
+        password=os.environ.get("INFLUX_PASSWORD"),
+        batch_size=args.influx_batch_size,
+        flush_interval=args.influx_flush_interval,
+        spool_path=args.spool_path,
+    )
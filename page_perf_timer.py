@@ -1,575 +1,58 @@
 import argparse
-import functools
-import hashlib
 import os
+import signal
 import sys
-import time
+import threading
 import uuid
 
-import requests
-
-# Generated by Selenium IDE
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions
-from selenium.webdriver.support.wait import WebDriverWait
-
-
-class SeleniumCustomWait(object):
-    """
-    Example usage:
-
-    with SeleniumCustomWait(driver, 0):
-        driver.find_element(By.ID, 'element-that-might-not-be-there')
-    """
-
-    def __init__(self, driver, new_wait=0):
-        self.driver = driver
-        self.original_wait = driver.timeouts.implicit_wait
-        self.new_wait = new_wait
-
-    def __enter__(self):
-        self.driver.implicitly_wait(self.new_wait)
-
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        self.driver.implicitly_wait(self.original_wait)
-
-
-class EndStepReached(Exception):
+import api_probe
+import job_queue_probe
+from history_scaling import DEFAULT_SIZES
+from network_shaper import PROFILES
+from output_sinks import add_sink_arguments, create_sink
+from targets import load_targets
+
+
+def run_target(args, sink):
+    if args.mode == "api":
+        api_probe.run_api_probe(args, sink)
+        return
+    if args.mode == "job_queue":
+        job_queue_probe.run_job_queue_probe(args, sink)
+        return
+    # Selenium is only imported by the modes that drive a browser
+    import browser_flow
+
+    if args.daemon:
+        browser_flow.run_daemon(args, sink)
+    elif args.users > 1:
+        browser_flow.run_concurrent_users(args, sink)
+    else:
+        # steps are written as they complete, including if the run fails
+        browser_flow.create_perf_timer(args, args.run_id, sink=sink).measure_timings()
+
+
+def run_targets(targets, sink):
     """
-    Raised when a specific action step has been reached
+    Run the flow against every target at once, writing to the same sink.
+    A target that fails does not stop the others.
     """
+    failed = []
 
-    pass
-
-
-def clock_action(action_name):
-    """
-    Decorator to measure time taken to perform
-    a function. The timing is stored in the wrapped
-    object, assumed to be first args to wrapped function.
-    :return:
-    """
-
-    def wrap(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            obj = args[0]
-            start = time.time()
-            retval = func(*args, **kwargs)
-            elapsed = time.time() - start
-            obj.timings[action_name] = {
-                "elapsed": elapsed,
-                # unix time
-                "timestamp": time.time_ns(),
-            }
-            if obj.end_step == action_name:
-                raise EndStepReached(action_name)
-            return retval
-
-        return wrapper
-
-    return wrap
-
-
-def download_and_calculate_md5(url, cookies, max_retries=5):
-    sig = hashlib.md5()
-    bytes_processed = 0
-    headers = {}
-    attempt = 0
-
-    while attempt < max_retries:
-        try:
-            if bytes_processed > 0:
-                # Use Range header to resume download
-                headers['Range'] = f'bytes={bytes_processed}-'
-
-            with requests.get(url, stream=True, headers=headers, cookies=cookies, timeout=120) as response:
-                response.raise_for_status()
-
-                # Check if server supports partial content
-                if response.status_code == 206 or bytes_processed == 0:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            sig.update(chunk)
-                            bytes_processed += len(chunk)
-                    return sig.hexdigest()
-                else:
-                    raise ValueError("Server does not support resuming downloads with 'Range' header.")
-
-        except (Exception) as e:
-            attempt += 1
-            print(f"Attempt {attempt} failed: {e}")
-            if attempt < max_retries:
-                # Exponential backoff before retrying
-                time_to_sleep = 2 ** attempt
-                # print(f"Retrying in {time_to_sleep} seconds...")
-                time.sleep(time_to_sleep)
-            else:
-                # print("Max retries reached. Download failed.")
-                raise TimeoutError("Max number of attempts exceeded")
-
-
-class PagePerfTimer(object):
-    def __init__(
-        self, server, username, password, end_step=None, run_id=None, workflow_name=None, category=None,
-    ):
-        self.run_id = run_id or uuid.uuid4()
-        self.server = server.rstrip("/")
-        self.username = username
-        self.password = password
-        self.end_step = end_step
-        self.workflow_name = workflow_name
-        self.category = category
-        self.timings = {}
-
-        """Start web driver"""
-        options = webdriver.FirefoxOptions()
-        if os.environ.get("SELENIUM_HEADLESS"):
-            options.add_argument("--no-sandbox")
-            options.add_argument("--headless")
-            options.add_argument("--disable-gpu")
-        self.driver = webdriver.Firefox(options=options)
-        # self.driver = webdriver.Firefox()
-        self.driver.implicitly_wait(180)
-        self.wait = WebDriverWait(self.driver, 180)
-
-    def find_login_button(self):
-        with SeleniumCustomWait(self.driver, 0):
-            try:
-                return self.driver.find_element(By.NAME, "login")
-            except NoSuchElementException:
-                return None
-
-    def find_sign_in_with_email(self):
-        with SeleniumCustomWait(self.driver, 0):
-            try:
-                return self.driver.find_element(
-                    By.XPATH, "//a[contains(., 'Sign in with email')]"
-                )
-            except NoSuchElementException:
-                return None
-
-    def find_biocommons_login_button(self):
-        with SeleniumCustomWait(self.driver, 0):
-            try:
-                return self.driver.find_element(
-                    By.XPATH, "//button[contains(., 'BioCommons Access')]"
-                )
-            except NoSuchElementException:
-                return None
-
-    def is_able_to_login(self, driver):
-        if self.find_login_button():
-            return True
-        elif self.find_sign_in_with_email():
-            return True
-        elif self.find_biocommons_login_button():
-            return True
-        else:
-            return False
-
-    def wait_for_history_panel_to_load(self):
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (By.XPATH, "//div/nav/h2[contains(., 'History')]")
-            )
-        )
-
-    @clock_action("login_page_load")
-    def load_galaxy_login(self):
-        # Open Galaxy window
-        self.driver.get(f"{self.server}/login")
-        # Wait for username entry to appear
-        self.wait.until(self.is_able_to_login)
-
-    def wait_for_galaxy_homepage(self):
-        # Wait for tool search box to appear
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (By.XPATH, "//input[@placeholder='search tools']")
-            )
-        )
-        # Wait for tool panel to load
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    "//div[@class='tool-panel-section']//a[contains(@class, 'title-link') and contains(., 'Get Data')]",
-                )
-            )
-        )
-
-    def login_with_biocommons(self):
-        self.find_biocommons_login_button().click()
-        self.wait.until(
-            expected_conditions.presence_of_element_located((By.ID, "username"))
-        ).send_keys(self.username)
-        password_input = self.driver.find_element(By.ID, "password")
-        password_input.send_keys(self.password)
-        password_input.send_keys(Keys.ENTER)
-
-    def login_with_galaxy_internal_login(self):
-        elem = self.find_sign_in_with_email()
-        # if sign in with email is available, this is galaxy-au's customised page.
-        if elem:
-            elem.click()
-        # Click username textbox
-        self.driver.find_element(By.NAME, "login").click()
-        # Type in username
-        self.driver.find_element(By.NAME, "login").send_keys(self.username)
-        # Type in password
-        self.driver.find_element(By.NAME, "password").send_keys(self.password)
-        # Submit login form
-        self.driver.find_element(By.NAME, "password").send_keys(Keys.ENTER)
-
-    @clock_action("home_page_load")
-    def login_to_galaxy_homepage(self):
-        if self.find_biocommons_login_button():
-            self.login_with_biocommons()
-        else:
-            self.login_with_galaxy_internal_login()
-        self.wait_for_galaxy_homepage()
-
-    @clock_action("dummy_file_upload")
-    def upload_dummy_file(self):
-        self.upload_file("https://s3.amazonaws.com/1000genomes/phase1/data/HG00553/exome_alignment/HG00553.mapped.illumina.mosaik.PUR.exome.20110411.bam")
-
-    def upload_file(self, url):
-        upload_activity = self.driver.find_element(By.ID, "activity-upload")
-        upload_activity.click()
-        # paste/fetch data
-        paste_button = self.driver.find_element(By.ID, "btn-new")
-        paste_button.click()
-        # paste/fetch data
-        upload_row = self.driver.find_element(By.XPATH, "//div[@id='upload-row-0']//textarea")
-        upload_row.send_keys(url)
-        # start
-        start_button = self.driver.find_element(By.ID, "btn-start")
-        start_button.click()
-        # close
-        close_button = self.driver.find_element(By.ID, "btn-close")
-        close_button.click()
-        # wait for history item to appear
-        filename = url.rsplit("/", 1)[-1]
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"//div[@data-index='0']//div[@data-state='running' and contains(., '{filename}')]",
-                )
-            )
-        )
-        # wait for item to complete
-        custom_wait = WebDriverWait(self.driver, 14400)
-        custom_wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"//div[@data-index='0']//div[@data-state='ok' and contains(., '{filename}')]",
-                )
-            )
-        )
-
-    def download_file(self, filename):
-        open_download_link = self.driver.find_element(By.XPATH, f"//div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]")
-        open_download_link.click()
-        with SeleniumCustomWait(self.driver, 1200):
-            download_link = self.driver.find_element(By.XPATH, f"//div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]//a[@title='Download'] | //div[@data-index]//div[@data-state='ok' and contains(., '{filename}')]//div[@title='Download']//a[contains(text(), 'Download Dataset')]")
-        all_cookies = self.driver.get_cookies()
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in all_cookies}
-        return download_and_calculate_md5(url=download_link.get_attribute("href"), cookies=cookies_dict)
-
-    @clock_action("dummy_file_download")
-    def download_dummy_file(self):
-        md5_sum = self.download_file("HG00553.mapped")
-        assert md5_sum == "6d178dd0bd8653087c14e150674f8784"
-
-    @clock_action("jbrowse_file_download")
-    def download_jbrowse_file(self):
-        self.download_file("JBrowse")
-
-    @clock_action("tool_search_load")
-    def search_for_tool(self):
-        # Select tool search box
-        tool_search = self.driver.find_element(
-            By.XPATH, "//input[@placeholder='search tools']"
-        )
-        tool_search.click()
-        # Search for BWA
-        tool_search.send_keys("bwa")
-        # Wait for BWA tool to appear
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    "//a[starts-with(@href, '/tool_runner?tool_id=toolshed.g2.bx.psu.edu%2Frepos%2Fdevteam%2Fbwa%2Fbwa%2F0.7')]",
-                )
-            )
-        )
-
-    @clock_action("tool_form_load")
-    def load_tool_form(self):
-        # Select BWA tool
-        bwa_tool = self.driver.find_element(
-            By.XPATH,
-            "//a[starts-with(@href,'/tool_runner?tool_id=toolshed.g2.bx.psu.edu%2Frepos%2Fdevteam%2Fbwa%2Fbwa%2F0.7')]",
-        )
-        bwa_tool.click()
-        # Wait for tool form to load and execute button to appear
-        self.wait.until(
-            expected_conditions.presence_of_element_located((By.ID, "execute"))
-        )
-
-    @clock_action("published_histories_page_load")
-    def load_published_histories(self):
-        # Request history page
-        self.driver.get(f"{self.server}/histories/list_published")
-
-        # Wait for history page to load
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    "//li[@id='histories-published-tab' and contains(., 'Public Histories')]",
-                )
-            )
-        )
-        self.wait_for_history_panel_to_load()
-
-    @clock_action("import_published_history")
-    def import_published_history(self):
-        # Search for the relevant history
-        search_history_input = self.driver.find_element(
-            By.XPATH,
-            f"//div[@id='histories-published-grid']//input[@placeholder='search histories']",
-        )
-        search_history_input.click()
-        search_history_input.send_keys(f"{self.workflow_name.lower()}_input_data")
-
-        # Select relevant history
-        import_history_btn = self.driver.find_element(
-            By.XPATH,
-            f"//table[@class='grid-table']//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{self.workflow_name.lower()}_input_data')]",
-        )
-        # Workaround for ElementClickInterceptedException
-        self.driver.execute_script("arguments[0].click();", import_history_btn)
-
-        # View history details
-        view_history_menu_item = import_history_btn.find_element(
-            By.XPATH,
-            f"./following-sibling::div//button[contains(@data-description, 'grid operation view')]",
-        )
-        view_history_menu_item.click()
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"//h3[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{self.workflow_name.lower()}_input_data')]",
-                )
-            )
-        )
-        # Invoke copy history dialogue
-        import_history_btn = self.driver.find_element(
-            By.XPATH,
-            f"//button[@title='Import this history' and contains(., 'Import this history')]",
-        )
-        import_history_btn.click()
-
-        # Set new history name
-        history_name_box = self.driver.find_element(By.ID, "copy-modal-title")
-        history_name_box.clear()
-        history_name_box.send_keys(f"{self.workflow_name}_Input_data_{self.run_id}")
-        self.driver.find_element(
-            By.XPATH,
-            f"//button[contains(., 'Copy History')]",
-        ).click()
-
-        # activate the history
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"//div[@class='alert alert-info' and contains(., 'History imported and is now your active history')]",
-                )
-            )
-        )
-
-        # Request history page
-        self.driver.get(f"{self.server}/histories/list")
-
-        # Wait for history panel to load with new history
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"//div[@id='current-history-panel']//h3[contains(., '{self.workflow_name}_Input_data_{self.run_id}')]",
-                )
-            )
-        )
-
-    @clock_action("workflow_list_page_load")
-    def load_workflow_list(self):
-        # Request workflows list page
-        self.driver.get(f"{self.server}/workflows/list_published")
-        # Wait for workflow page to load and import button to appear
-        self.wait.until(
-            expected_conditions.presence_of_element_located(
-                (By.XPATH, "//li[@id='published' and contains(., 'Public workflows')]")
-            )
-        )
-
-    @clock_action("workflow_run_page_load")
-    def load_workflow_run_form(self):
-        # Search for the relevant history
-        search_workflow_input = self.driver.find_element(
-            By.XPATH,
-            f"//div[@id='workflow-list-filter']//input",
-        )
-        search_workflow_input.click()
-        search_workflow_input.send_keys(f"{self.workflow_name.lower()}")
-
-        # wait for list to be filtered
-        self.wait.until(
-            lambda d: len(
-                d.find_elements(By.CSS_SELECTOR, "#workflow-cards .workflow-card")
-            )
-            == 1
-        )
-
-        # Select relevant workflow
-        run_workflow_btn = self.driver.find_element(By.ID, "workflow-run-button")
-        # Workaround for ElementClickInterceptedException
-        self.driver.execute_script("arguments[0].click();", run_workflow_btn)
-
-        # Wait for workflow form to load and run button to appear
-        self.wait.until(
-            expected_conditions.presence_of_element_located((By.ID, "run-workflow"))
-        )
-
-    @clock_action("run_workflow")
-    def run_workflow(self):
-        if self.workflow_name == "Selenium_test_1":
-            # Select relevant choice
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='1']//input[1]/following-sibling::span[1]",
-            )
-            input_1_select.click()
-            # Select relevant choice
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='1']//ul[@role='listbox']//li[@role='option']//span[contains(., 'Subsample of reads from human exome R1')]",
-            )
-            input_1_select.click()
-            workflow_wait = 14400 # 4 hours
-        elif self.workflow_name == "Selenium_test_2":
-            # Select relevant choice
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='1']//input[1]/following-sibling::span[1]",
-            )
-            input_1_select.click()
-            # Select relevant choice
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='1']//ul[@role='listbox']//li[@role='option']//span[contains(., 'Subsample of reads from human exome R1')]",
-            )
-            input_1_select.click()
-            workflow_wait = 14400
-        elif self.workflow_name == "Selenium_test_3":
-            # Select forward reads
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='Forward Reads']//input[1]/following-sibling::span[1]",
-            )
-            input_1_select.click()
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='Forward Reads']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ERR019289_1.fastq.gz')]",
-            )
-            input_1_select.click()
-            # Select reverse reads
-            input_2_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='Reverse Reads']//input[1]/following-sibling::span[1]",
-            )
-            input_2_select.click()
-            input_2_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='Reverse Reads']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ERR019289_2.fastq.gz')]",
-            )
-            input_2_select.click()
-            workflow_wait = 14400
-        elif self.workflow_name == "Selenium_test_4" or self.workflow_name == "Selenium_test_6":
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='ARTIC primers to amplicon assignments']//input[1]/following-sibling::span[1]",
-            )
-            input_1_select.click()
-            # Select relevant choice
-            input_1_select = self.driver.find_element(
-                By.XPATH,
-                "//div[@data-label='ARTIC primers to amplicon assignments']//ul[@role='listbox']//li[@role='option']//span[contains(., 'ARTIC_SARS_CoV-2_amplicon_info_v3.tsv')]",
-            )
-            input_1_select.click()
-            workflow_wait = 18000 # 5 hours
-        elif self.workflow_name == "Selenium_test_5":
-            workflow_wait = 21600 # 6 hours
-        elif self.workflow_name == "Selenium_test_7":
-            workflow_wait = 36000 # 10 hours
-        else:
-            raise Exception(f"Workflow name not in known list: {self.workflow_name}")
-
-        # Run the workflow
-        self.driver.find_element(By.ID, "run-workflow").click()
-
-        # wait for the running message to appear
-        loading_xpath = "//div[@id='center']//div[@role='tabpanel']//div[@role='alert']//span[@data-description='loading message' and contains(., 'Waiting to complete invocation')]"
-        self.wait.until(expected_conditions.presence_of_element_located((By.XPATH, loading_xpath)))
-
-        # Wait for running message to disappear
-        custom_wait = WebDriverWait(self.driver, workflow_wait)
-        custom_wait.until(expected_conditions.invisibility_of_element_located((By.XPATH, loading_xpath)))
-
-    def run_test_sequence(self):
-        self.load_galaxy_login()
-        self.login_to_galaxy_homepage()
-        self.search_for_tool()
-        self.load_tool_form()
-        self.load_published_histories()
-        self.import_published_history()
-        if self.workflow_name == "Selenium_test_5":
-            self.upload_dummy_file()
-        self.load_workflow_list()
-        self.load_workflow_run_form()
-        self.run_workflow()
-        if self.workflow_name == "Selenium_test_5":
-            self.download_dummy_file()
-        if self.workflow_name == "Selenium_test_7":
-            self.download_jbrowse_file()
-
-    def measure_timings(self):
-        self.timings = {}
+    def run(target):
         try:
-            try:
-                self.run_test_sequence()
-            except EndStepReached:
-                pass
-        finally:
-            self.driver.quit()
-
-    def print_timings(self):
-        for action, data in self.timings.items():
-            print(
-                f"user_flow_performance,server={self.server},action={action},run_id={self.run_id},end_step={self.end_step},workflow_name={self.workflow_name},category={self.category} time_taken={data.get('elapsed')} {data.get('timestamp')}"
-            )
-
+            run_target(target, sink)
+        except Exception as e:
+            print(f"Run against {target.server} failed: {e}", file=sys.stderr)
+            failed.append(target.server)
 
-def from_env_or_required(key):
-    return {"default": os.environ[key]} if os.environ.get(key) else {"required": True}
+    # daemon threads, so that a stopped container does not wait for them
+    threads = [threading.Thread(target=run, args=(target,), daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failed
 
 
 def create_parser():
@@ -579,21 +62,27 @@ def create_parser():
     parser.add_argument(
         "-s",
         "--server",
-        default=os.environ.get("GALAXY_SERVER") or "https://usegalaxy.org.au",
-        help="Galaxy server url",
+        nargs="+",
+        default=[os.environ.get("GALAXY_SERVER") or "https://usegalaxy.org.au"],
+        help="Galaxy server url. If several are given, the flow is run against all of them at the same time",
     )
     parser.add_argument(
         "-u",
         "--username",
-        **from_env_or_required("GALAXY_USERNAME"),
+        default=os.environ.get("GALAXY_USERNAME"),
         help="Galaxy username to use (or set GALAXY_USERNAME env var)",
     )
     parser.add_argument(
         "-p",
         "--password",
-        **from_env_or_required("GALAXY_PASSWORD"),
+        default=os.environ.get("GALAXY_PASSWORD"),
         help="Password to use (or set GALAXY_PASSWORD env var)",
     )
+    parser.add_argument(
+        "--targets",
+        default=None,
+        help="JSON file listing the servers to run against at the same time, each with optional credentials and workflow name. See targets.py",
+    )
     parser.add_argument(
         "--end_step",
         default="tool_form_load",
@@ -614,27 +103,220 @@ def create_parser():
         default="default",
         help="A category for this run. Defaults to the string 'default'.",
     )
+    parser.add_argument(
+        "--download_connections",
+        type=int,
+        default=1,
+        help="Number of concurrent range requests to use when downloading files. Defaults to 1, a single stream",
+    )
+    parser.add_argument(
+        "--upload_size",
+        type=float,
+        default=0,
+        help="Size in MB of a generated file to push through the resumable upload API after importing the published history, as the local_file_upload step. Defaults to 0, no upload",
+    )
+    parser.add_argument(
+        "--upload_chunk_size",
+        type=float,
+        default=10,
+        help="Size in MB of each upload chunk. Defaults to 10, as in Galaxy's upload dialog",
+    )
+    parser.add_argument(
+        "--upload_parallelism",
+        type=int,
+        default=1,
+        help="Number of parts to upload at once, if the server supports joining uploaded parts (the TUS concatenation extension). Defaults to 1",
+    )
+    parser.add_argument(
+        "--upload_seed",
+        type=int,
+        default=0,
+        help="Seed of the random data uploaded. Defaults to 0",
+    )
+    parser.add_argument(
+        "--wait_strategy",
+        choices=["event", "poll"],
+        default="event",
+        help="Wait for page elements with in-page MutationObservers (event), or by polling through WebDriver (poll). Defaults to event",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=1,
+        help="Repeat the tool search, tool form, published histories and workflow list steps this many times within the same session, and output a summary of each step's timings",
+    )
+    add_sink_arguments(parser)
+    parser.add_argument(
+        "--session_cache",
+        default=os.environ.get("SESSION_CACHE_DIR"),
+        help="Directory in which to cache the logged in session, so that later runs start at home_page_load without logging in (or set SESSION_CACHE_DIR env var). Runs are tagged with session=cached or session=login",
+    )
+    parser.add_argument(
+        "--session_cache_ttl",
+        type=int,
+        default=43200,
+        help="Seconds after which a cached session is no longer used. Defaults to 43200",
+    )
+    parser.add_argument(
+        "--cache_passes",
+        action="store_true",
+        help="Load each page twice, first with the browser cache bypassed and then with a warm cache, tagging each with cache=cold or cache=warm",
+    )
+    parser.add_argument(
+        "--network_profile",
+        choices=sorted(PROFILES),
+        default=None,
+        help="Send the browser's traffic through a local proxy that emulates a slow link, and tag lines with network=<profile>. Use the options below to adjust a profile, or to configure the custom profile",
+    )
+    parser.add_argument(
+        "--network_rtt",
+        type=float,
+        default=None,
+        help="Round trip time in seconds added by the network profile",
+    )
+    parser.add_argument(
+        "--network_jitter",
+        type=float,
+        default=None,
+        help="Maximum random variation in seconds of each one way delay",
+    )
+    parser.add_argument(
+        "--network_down_kbps",
+        type=float,
+        default=None,
+        help="Download bandwidth cap in kbit/s",
+    )
+    parser.add_argument(
+        "--network_up_kbps",
+        type=float,
+        default=None,
+        help="Upload bandwidth cap in kbit/s",
+    )
+    parser.add_argument(
+        "--network_loss",
+        type=float,
+        default=None,
+        help="Probability of a chunk of data being lost and retransmitted",
+    )
+    parser.add_argument(
+        "--monitor_invocation",
+        action="store_true",
+        help="Follow workflow invocations through the API, reporting queue and run times for each job, instead of waiting in the browser",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=[
+            "browser", "api", "tool_search_sweep", "tool_form_benchmark", "history_scaling", "job_queue", "self_benchmark",
+        ],
+        default="browser",
+        help="Run the user flow in a browser, replay its requests directly against the API, sweep tool search with the queries in --tool_queries, load the form of each tool in --tool_ids, time the history panel with histories of each of --history_sizes, time trivial jobs through the job queue, or measure the timer's own overhead against a local mock Galaxy. Defaults to browser",
+    )
+    parser.add_argument(
+        "--max_overhead",
+        type=float,
+        default=None,
+        help="In self_benchmark mode, exit with an error if the median overhead of any step is above this many seconds",
+    )
+    parser.add_argument(
+        "--tool_queries",
+        default="tool_queries.tsv",
+        help="File of tab separated tool search queries and expected tool ids, for tool_search_sweep mode. Defaults to tool_queries.tsv",
+    )
+    parser.add_argument(
+        "--tool_ids",
+        default="tool_ids.txt",
+        help="File with one tool id per line, for tool_form_benchmark mode. Defaults to tool_ids.txt",
+    )
+    parser.add_argument(
+        "--form_workers",
+        type=int,
+        default=4,
+        help="Number of browsers loading tool forms concurrently in tool_form_benchmark mode. Defaults to 4",
+    )
+    parser.add_argument(
+        "--history_sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SIZES),
+        help="Numbers of items in the histories to time in history_scaling mode. Missing histories are built through the API, and kept for later runs. Defaults to 10 100 1000 10000",
+    )
+    parser.add_argument(
+        "--history_build_workers",
+        type=int,
+        default=8,
+        help="Number of concurrent API requests used to build histories in history_scaling mode. Defaults to 8",
+    )
+    job_queue_probe.add_job_probe_arguments(parser)
+    parser.add_argument(
+        "--span_tree",
+        action="store_true",
+        help="Also output timings for the phases within each step, not only the top level steps",
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        default=1,
+        help="Number of concurrent user flows to run, each with its own browser. Defaults to 1",
+    )
+    parser.add_argument(
+        "--ramp_up",
+        type=float,
+        default=0,
+        help="Seconds over which to spread the start of concurrent user flows. Defaults to 0",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run continuously, reusing a pool of warm browsers instead of starting one per run",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=300,
+        help="Seconds between the start of successive runs in daemon mode. Defaults to 300",
+    )
+    parser.add_argument(
+        "--pool_size",
+        type=int,
+        default=1,
+        help="Number of warm browsers to keep in daemon mode. Defaults to 1",
+    )
     return parser
 
 
 def main():
     parser = create_parser()
     args = parser.parse_args()
+    # exit cleanly when the container is stopped, so that buffered points are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
 
-    perf_timer = PagePerfTimer(
-        args.server,
-        args.username,
-        args.password,
-        args.end_step,
-        args.run_id,
-        args.workflow_name,
-        args.category,
-    )
+    if args.mode == "self_benchmark":
+        import browser_flow
+
+        sink = create_sink(args)
+        try:
+            return 0 if browser_flow.run_self_benchmark(args, sink) else 1
+        finally:
+            sink.close()
+
+    try:
+        targets = load_targets(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if len(targets) > 1 and not args.daemon and not args.run_id:
+        # the same run_id for every server, to line up simultaneous samples
+        run_id = str(uuid.uuid4())
+        for target in targets:
+            target.run_id = run_id
+
+    sink = create_sink(args)
     try:
-        perf_timer.measure_timings()
+        if len(targets) == 1:
+            run_target(targets[0], sink)
+        elif run_targets(targets, sink):
+            return 1
     finally:
-        # print results so far
-        perf_timer.print_timings()
+        sink.close()
     return 0
 
 
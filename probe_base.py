@@ -0,0 +1,170 @@
+"""
+What the browserless probes (api_probe.py and job_queue_probe.py) have in
+common: the step hooks and output of a clocked run, the daemon loop that
+reuses one session across runs, and their shared command line options.
+"""
+import abc
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import galaxy_api
+from line_protocol import format_spans
+from output_sinks import StepWriter, create_sink
+from timing import EndStepReached, SpanTimer
+
+
+class ProbeBase(abc.ABC):
+    """
+    A run of clocked steps against the Galaxy API. Subclasses set mode, the
+    tag their lines are written with, and implement run_test_sequence.
+    """
+
+    mode = None
+
+    def __init__(
+        self, server, username, password, end_step=None, run_id=None, category=None,
+        session=None, sink=None, span_tree=False,
+    ):
+        self.run_id = run_id or uuid.uuid4()
+        self.server = server.rstrip("/")
+        self.username = username
+        self.password = password
+        self.end_step = end_step
+        self.category = category
+        # Reuse a session across runs to keep connections alive
+        self.session = session or galaxy_api.create_session()
+        self.spans = SpanTimer()
+        self.writer = StepWriter(sink, self.line_tags, span_tree) if sink else None
+
+    def before_step(self, action_name):
+        pass
+
+    def after_step(self, span):
+        if self.writer:
+            self.writer.write_completed(self.spans)
+
+    def get(self, path, **params):
+        return galaxy_api.get_json(self.session, f"{self.server}{path}", **params)
+
+    def post(self, path, payload):
+        return galaxy_api.post_json(self.session, f"{self.server}{path}", payload)
+
+    @abc.abstractmethod
+    def run_test_sequence(self):
+        pass
+
+    def measure_timings(self):
+        self.spans = SpanTimer()
+        try:
+            self.run_test_sequence()
+        except EndStepReached:
+            pass
+        finally:
+            if self.writer:
+                self.writer.write_completed(self.spans)
+
+    def line_tags(self, action):
+        return {
+            "server": self.server,
+            "action": action,
+            "run_id": self.run_id,
+            "category": self.category,
+            "mode": self.mode,
+        }
+
+    def format_timings(self, span_tree=False):
+        return format_spans(self.spans, self.line_tags, span_tree)
+
+
+def run_probe(args, create_probe):
+    """
+    Run a probe once, or every args.interval seconds in daemon mode,
+    reusing the same session, and so its connection pool, for every run.
+    create_probe is called with the run_id and session of each run.
+    """
+    session = galaxy_api.create_session()
+    while True:
+        next_run = time.time() + args.interval
+        probe = create_probe(args.run_id if not args.daemon else None, session)
+        try:
+            probe.measure_timings()
+        except Exception as e:
+            if not args.daemon:
+                raise
+            print(f"Run {probe.run_id} failed: {e}", file=sys.stderr)
+        if not args.daemon:
+            return
+        time.sleep(max(0, next_run - time.time()))
+
+
+def from_env_or_required(key):
+    return {"default": os.environ[key]} if os.environ.get(key) else {"required": True}
+
+
+def create_probe_parser(description):
+    """
+    A parser with the options shared by every probe. The output options
+    are added by each probe after its own, with add_sink_arguments.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "-s",
+        "--server",
+        default=os.environ.get("GALAXY_SERVER") or "https://usegalaxy.org.au",
+        help="Galaxy server url",
+    )
+    parser.add_argument(
+        "-u",
+        "--username",
+        **from_env_or_required("GALAXY_USERNAME"),
+        help="Galaxy username to use (or set GALAXY_USERNAME env var)",
+    )
+    parser.add_argument(
+        "-p",
+        "--password",
+        **from_env_or_required("GALAXY_PASSWORD"),
+        help="Password to use (or set GALAXY_PASSWORD env var)",
+    )
+    parser.add_argument(
+        "--run_id",
+        default=None,
+        help="A unique id for this timing run. If not specified, a uuid is generated",
+    )
+    parser.add_argument(
+        "--category",
+        default="default",
+        help="A category for this run. Defaults to the string 'default'.",
+    )
+    parser.add_argument(
+        "--span_tree",
+        action="store_true",
+        help="Also output timings for the phases within each step, not only the top level steps",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run continuously, reusing the same connections for every run",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=300,
+        help="Seconds between the start of successive runs in daemon mode. Defaults to 300",
+    )
+    return parser
+
+
+def probe_main(parser, run):
+    """
+    Parse the command line, and call run with the args and an output sink
+    """
+    args = parser.parse_args()
+    sink = create_sink(args)
+    try:
+        run(args, sink)
+    finally:
+        sink.close()
+    return 0
@@ -0,0 +1,220 @@
+"""
+Download engine that fetches a file over several concurrent byte range
+requests, writing into a memory mapped temporary file while the md5 is
+computed in order as the data arrives.
+"""
+import concurrent.futures
+import hashlib
+import mmap
+import tempfile
+import sys
+import threading
+import time
+
+import galaxy_api
+
+CHUNK_SIZE = 1024 * 1024
+HASH_BLOCK_SIZE = 16 * CHUNK_SIZE
+
+
+class DownloadResult(object):
+    def __init__(self, md5, total_bytes, elapsed, ttfb, connection_rates, retries):
+        self.md5 = md5
+        self.total_bytes = total_bytes
+        self.elapsed = elapsed
+        self.ttfb = ttfb
+        # bytes/sec achieved by each connection, from its own first byte
+        self.connection_rates = connection_rates
+        self.retries = retries
+
+    def fields(self):
+        transfer_time = self.elapsed - self.ttfb
+        fields = {
+            "bytes": self.total_bytes,
+            "connections": len(self.connection_rates),
+            "ttfb": self.ttfb,
+            "mb_per_sec": self.total_bytes / transfer_time / 1e6 if transfer_time > 0 else None,
+            "retries": self.retries,
+        }
+        for index, rate in enumerate(self.connection_rates):
+            fields[f"connection_{index}_mb_per_sec"] = rate / 1e6 if rate else None
+        return fields
+
+
+class ByteRange(object):
+    def __init__(self, start, length):
+        self.start = start
+        self.length = length
+        # bytes written so far, from start
+        self.written = 0
+        self.first_byte = None
+        self.finished = None
+
+    @property
+    def rate(self):
+        if self.finished and self.first_byte is not None and self.finished > self.first_byte:
+            return self.length / (self.finished - self.first_byte)
+        return None
+
+
+class RangedDownloader(object):
+    """
+    Example usage:
+
+    result = RangedDownloader(url, cookies, connections=4).download()
+    assert result.md5 == expected_md5
+
+    With connections=1, the file is streamed over a single connection
+    instead, for comparison.
+    """
+
+    def __init__(self, url, cookies=None, connections=1, max_retries=5):
+        self.url = url
+        self.connections = connections
+        self.max_retries = max_retries
+        self.session = galaxy_api.create_session(cookies=cookies, pool_size=connections)
+        self.retries = 0
+        self.lock = threading.Lock()
+        self.progress = threading.Condition(self.lock)
+        self.start = None
+        self.first_byte = None
+
+    def mark_first_byte(self):
+        with self.lock:
+            if self.first_byte is None:
+                self.first_byte = time.perf_counter()
+
+    def request_range(self, start, end=None):
+        headers = {"Range": f"bytes={start}-{'' if end is None else end}"} if start or end is not None else {}
+        response = self.session.get(
+            self.url, stream=True, headers=headers, timeout=galaxy_api.REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        if headers and response.status_code != 206:
+            response.close()
+            raise ValueError("Server does not support resuming downloads with 'Range' header.")
+        return response
+
+    def with_retries(self, func):
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                attempt += 1
+                print(f"Attempt {attempt} failed: {e}", file=sys.stderr)
+                if attempt >= self.max_retries:
+                    raise TimeoutError("Max number of attempts exceeded")
+                with self.lock:
+                    self.retries += 1
+                # Exponential backoff before retrying
+                time.sleep(2 ** attempt)
+
+    def download(self):
+        self.start = time.perf_counter()
+        if self.connections > 1:
+            total_bytes = self.with_retries(self.probe_size)
+            if total_bytes is not None:
+                return self.download_ranges(total_bytes)
+        return self.download_single()
+
+    def probe_size(self):
+        """
+        Return the size of the file, or None if ranges are not supported
+        """
+        with self.session.get(
+            self.url, stream=True, headers={"Range": "bytes=0-0"}, timeout=galaxy_api.REQUEST_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code != 206 or "/" not in content_range or content_range.endswith("/*"):
+                return None
+            next(response.iter_content(chunk_size=1), None)
+            self.mark_first_byte()
+            return int(content_range.rsplit("/", 1)[1])
+
+    def download_single(self):
+        sig = hashlib.md5()
+        byte_range = ByteRange(0, None)
+
+        def fetch():
+            with self.request_range(byte_range.written) as response:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        if byte_range.first_byte is None:
+                            self.mark_first_byte()
+                            byte_range.first_byte = time.perf_counter()
+                        sig.update(chunk)
+                        byte_range.written += len(chunk)
+
+        self.with_retries(fetch)
+        byte_range.finished = time.perf_counter()
+        byte_range.length = byte_range.written
+        return self.result(sig.hexdigest(), byte_range.written, [byte_range])
+
+    def fetch_range(self, buffer, byte_range):
+        def fetch():
+            start = byte_range.start + byte_range.written
+            end = byte_range.start + byte_range.length - 1
+            with self.request_range(start, end) as response:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    if byte_range.first_byte is None:
+                        self.mark_first_byte()
+                        byte_range.first_byte = time.perf_counter()
+                    offset = byte_range.start + byte_range.written
+                    buffer[offset:offset + len(chunk)] = chunk
+                    with self.progress:
+                        byte_range.written += len(chunk)
+                        self.progress.notify_all()
+            if byte_range.written < byte_range.length:
+                raise ValueError(f"Range ended early at byte {byte_range.start + byte_range.written}")
+
+        self.with_retries(fetch)
+        byte_range.finished = time.perf_counter()
+
+    def download_ranges(self, total_bytes):
+        sig = hashlib.md5()
+        if not total_bytes:
+            return self.result(sig.hexdigest(), 0, [])
+        range_size = -(-total_bytes // self.connections)
+        ranges = [
+            ByteRange(start, min(range_size, total_bytes - start))
+            for start in range(0, total_bytes, range_size)
+        ]
+
+        with tempfile.TemporaryFile() as temp_file:
+            temp_file.truncate(total_bytes)
+            with mmap.mmap(temp_file.fileno(), total_bytes) as buffer:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                    futures = [executor.submit(self.fetch_range, buffer, byte_range) for byte_range in ranges]
+                    # Hash each range in order as soon as its bytes have been written
+                    for byte_range, future in zip(ranges, futures):
+                        hashed = 0
+                        while hashed < byte_range.length:
+                            with self.progress:
+                                while byte_range.written == hashed and not future.done():
+                                    self.progress.wait(1)
+                                # hash in bounded blocks, to avoid copying a whole range at once
+                                available = min(byte_range.written, hashed + HASH_BLOCK_SIZE)
+                            if available == hashed:
+                                # the range failed, so raise its error
+                                future.result()
+                            offset = byte_range.start
+                            sig.update(buffer[offset + hashed:offset + available])
+                            hashed = available
+                    for future in futures:
+                        future.result()
+        return self.result(sig.hexdigest(), total_bytes, ranges)
+
+    def result(self, md5, total_bytes, ranges):
+        end = time.perf_counter()
+        return DownloadResult(
+            md5=md5,
+            total_bytes=total_bytes,
+            elapsed=end - self.start,
+            ttfb=(self.first_byte or end) - self.start,
+            connection_rates=[byte_range.rate for byte_range in ranges],
+            retries=self.retries,
+        )
@@ -1,21 +1,36 @@
 import argparse
+import concurrent.futures
+import copy
 import imaplib
+import math
 import os
+import queue
+import re
+import select
 import sys
 import time
 import uuid
+from datetime import timezone
+from email.parser import BytesHeaderParser
+from email.utils import getaddresses, parsedate_to_datetime
 
 from bioblend import galaxy
 
+import requests
+
 import tenacity
 
 # Generated by Selenium IDE
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions
-from selenium.webdriver.support.wait import WebDriverWait
+# Selenium is only needed to register through the browser
+try:
+    from selenium import webdriver
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.wait import WebDriverWait
+except ImportError:
+    webdriver = None
 
 
 class SeleniumCustomWait(object):
@@ -38,6 +53,332 @@ class SeleniumCustomWait(object):
         self.driver.implicitly_wait(self.original_wait)
 
 
+# How often to check for new mail on servers without IDLE
+NOOP_INTERVAL = 0.5
+# Servers may drop a client that has been idling for 30 minutes, so renew IDLE well before that
+MAX_IDLE_SECONDS = 300
+# While registrations are still being submitted, stop waiting for mail this often to check on them
+SUBMIT_CHECK_SECONDS = 5
+ACTIVATION_CRITERIA = 'SUBJECT "Galaxy Account Activation"'
+REQUEST_TIMEOUT = 60
+# the token Galaxy's client sends with forms, from the config embedded in its pages
+SESSION_CSRF_TOKEN = re.compile(r'"session_csrf_token"\s*:\s*"([^"]+)"')
+RECEIVED_BY = re.compile(r"\bby\s+([^\s;()]+)", re.IGNORECASE)
+
+
+def header_time(value):
+    """
+    Seconds since the epoch of an email header date, or None if it can't be parsed
+    """
+    try:
+        parsed = parsedate_to_datetime(value.strip())
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def delivery_hops(headers, mailbox_time, submitted_at):
+    """
+    Split the delivery of an email into hops: from the registration being
+    submitted, to the Date the email was written, through each relay that
+    added a Received header, to the mailbox storing it. Returns a list of
+    (host, seconds) in delivery order, naming the host at the end of each hop.
+
+    Header times have one second resolution and come from each host's own
+    clock, so a hop can come out slightly negative.
+    """
+    stamps = [("galaxy", submitted_at)]
+    date = header_time(headers.get("Date", ""))
+    if date is not None:
+        stamps.append(("sender", date))
+    # relays add their Received header at the top, so the first relay's is last
+    for received in reversed(headers.get_all("Received") or []):
+        received = " ".join(str(received).split())
+        received_time = header_time(received.rpartition(";")[2])
+        if received_time is None:
+            continue
+        by = RECEIVED_BY.search(received)
+        stamps.append((by.group(1) if by else "unknown", received_time))
+    if mailbox_time is not None:
+        stamps.append(("mailbox", mailbox_time))
+    return [(host, end - start) for (_, start), (host, end) in zip(stamps, stamps[1:])]
+
+
+def format_string_field(value):
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'
+
+
+def plus_address(email, tag):
+    """
+    Make a distinct address that is delivered to the same mailbox, e.g.
+    user@example.org -> user+tag@example.org
+    """
+    local, _, domain = email.rpartition("@")
+    separator = "-" if "+" in local else "+"
+    return f"{local}{separator}{tag}@{domain}"
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of a list of values
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def create_driver():
+    if webdriver is None:
+        raise RuntimeError("Selenium is not installed, so registration can only use --registration_method http")
+    chrome_options = webdriver.ChromeOptions()
+    if os.environ.get("SELENIUM_HEADLESS"):
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--disable-gpu")
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.implicitly_wait(180)
+    return driver
+
+
+def test_account_pattern(email):
+    """
+    Matches the email, and the plus addressed emails made from it, but not
+    other addresses that only start with the same local part
+    """
+    local, _, domain = email.rpartition("@")
+    # the same separator as plus_address
+    separator = "-" if "+" in local else "+"
+    return re.compile(
+        rf"^{re.escape(local)}({re.escape(separator)}[^@]+)?@{re.escape(domain)}$", re.IGNORECASE
+    )
+
+
+def find_test_accounts(gi, email):
+    """
+    Find accounts made by earlier runs with the email, including those
+    that were deleted but never purged
+    """
+    pattern = test_account_pattern(email)
+    local = email.rpartition("@")[0]
+    users = gi.users.get_users(f_email=local) + gi.users.get_users(deleted=True, f_email=local)
+    return [user for user in users if pattern.match(user["email"]) and not user.get("purged")]
+
+
+def delete_accounts(gi, users, workers=5):
+    """
+    Delete and purge the users concurrently. Returns the number deleted and
+    the number that could not be.
+    """
+
+    def delete(user):
+        if not user.get("deleted"):
+            gi.users.delete_user(user["id"])
+        gi.users.delete_user(user["id"], purge=True)
+
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(delete, user): user for user in users}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Could not delete {futures[future]['email']}: {e}", file=sys.stderr)
+    return len(users) - failed, failed
+
+
+class RegistrationError(Exception):
+    pass
+
+
+class Registration(object):
+    """
+    One of the accounts registered in a concurrent registration run.
+    Times are from perf_counter.
+    """
+
+    def __init__(self, email, username):
+        self.email = email
+        self.username = username
+        self.submitted = None
+        self.delivered = None
+        self.error = None
+
+    @property
+    def latency(self):
+        """
+        Time from submission to the email arriving, or None if the
+        registration was never submitted, such as when it failed after
+        Galaxy had sent the email
+        """
+        if self.submitted is None or self.delivered is None:
+            return None
+        return self.delivered - self.submitted
+
+    @property
+    def status(self):
+        if self.error or self.submitted is None:
+            return "failed"
+        return "success" if self.delivered is not None else "lost"
+
+
+class ImapMailWatcher(object):
+    """
+    Keeps one logged in IMAP connection open, and waits on it for new mail.
+    New mail is pushed by the server with IDLE where it is supported, and
+    otherwise found by sending a NOOP every NOOP_INTERVAL.
+
+    Example usage:
+
+    watcher = ImapMailWatcher(imap_server, imap_port, imap_username, imap_password)
+    watcher.connect()
+    known = watcher.search(criteria)
+    ... send the email ...
+    uid, arrival = watcher.wait_for_message(criteria, timeout=120, known=known)
+    watcher.close()
+    """
+
+    def __init__(self, server, port, username, password, mailbox="inbox", use_idle=True):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.mailbox = mailbox
+        self.use_idle = use_idle
+        self.imap = None
+        self.buffer = b""
+        self.tag_count = 0
+
+    @property
+    def method(self):
+        return "idle" if self.use_idle else "noop"
+
+    def connect(self):
+        self.imap = imaplib.IMAP4_SSL(self.server, self.port)
+        self.imap.login(self.username, self.password)
+        self.imap.select(self.mailbox)
+        self.use_idle = self.use_idle and "IDLE" in self.imap.capabilities
+
+    def close(self):
+        if not self.imap:
+            return
+        try:
+            self.imap.close()
+            self.imap.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+        self.imap = None
+
+    def search(self, criteria):
+        _, data = self.imap.uid("SEARCH", None, criteria)
+        return set(data[0].split()) if data and data[0] else set()
+
+    def fetch_headers(self, uid):
+        """
+        Returns a message's headers, and the time it was stored in the mailbox
+        """
+        _, data = self.imap.uid("FETCH", uid, "(INTERNALDATE BODY.PEEK[HEADER])")
+        headers = b""
+        response = b""
+        for part in data:
+            if isinstance(part, tuple):
+                response += part[0]
+                headers += part[1]
+            elif part:
+                response += part
+        internal_date = imaplib.Internaldate2tuple(response)
+        mailbox_time = time.mktime(internal_date) if internal_date else None
+        return BytesHeaderParser().parsebytes(headers), mailbox_time
+
+    def read_line(self, deadline):
+        """
+        Read a response line straight from the socket, or None if nothing
+        arrives before the deadline. imaplib's own readline can't be given a
+        timeout without breaking the connection.
+        """
+        sock = self.imap.socket()
+        while b"\r\n" not in self.buffer:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            # data already decrypted by the SSL layer does not wake select
+            pending = getattr(sock, "pending", None)
+            if not (pending and pending()):
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    return None
+            data = sock.recv(4096)
+            if not data:
+                raise imaplib.IMAP4.abort("Connection closed while waiting for IMAP response")
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b"\r\n")
+        return line
+
+    def idle(self, timeout):
+        """
+        Wait in IDLE until the server reports new mail, or the timeout passes.
+        Returns the perf_counter time the new mail was reported, or None.
+        """
+        self.tag_count += 1
+        tag = f"W{self.tag_count}".encode("ascii")
+        self.imap.send(tag + b" IDLE\r\n")
+        line = self.read_line(time.perf_counter() + 30)
+        if not line or not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE not accepted: {line!r}")
+        deadline = time.perf_counter() + timeout
+        reported = None
+        while reported is None:
+            line = self.read_line(deadline)
+            if line is None:
+                break
+            if line.startswith(b"*") and (line.endswith(b"EXISTS") or line.endswith(b"RECENT")):
+                reported = time.perf_counter()
+        self.imap.send(b"DONE\r\n")
+        while True:
+            line = self.read_line(time.perf_counter() + 30)
+            if line is None:
+                raise imaplib.IMAP4.abort("No response to IDLE DONE")
+            if line.startswith(tag):
+                break
+        return reported
+
+    def noop(self):
+        self.imap.noop()
+        return time.perf_counter()
+
+    def wait_for_new_mail(self, timeout):
+        """
+        Returns the perf_counter time at which new mail may have been
+        seen, or None if the timeout passed.
+        """
+        if self.use_idle:
+            return self.idle(min(timeout, MAX_IDLE_SECONDS))
+        time.sleep(min(timeout, NOOP_INTERVAL))
+        return self.noop()
+
+    def wait_for_message(self, criteria, timeout, known=(), start=None):
+        """
+        Wait for a message matching the criteria that is not one of the known
+        uids. Returns its uid and the seconds from start (or from the call)
+        until the server reported it, or None, None on timeout.
+        """
+        start = start if start is not None else time.perf_counter()
+        deadline = start + timeout
+        seen_at = time.perf_counter()
+        while True:
+            new_uids = self.search(criteria) - set(known)
+            if new_uids:
+                return min(new_uids, key=int), max(0.0, seen_at - start)
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None, None
+            seen_at = self.wait_for_new_mail(remaining) or time.perf_counter()
+
+
 class RegistrationEmailVerifier(object):
     def __init__(
         self,
@@ -50,6 +391,9 @@ class RegistrationEmailVerifier(object):
         imap_username,
         imap_password,
         api_key,
+        imap_watch="idle",
+        imap_timeout=120,
+        registration_method="browser",
     ):
         self.run_id = uuid.uuid4()
         self.server = server
@@ -61,18 +405,35 @@ class RegistrationEmailVerifier(object):
         self.imap_port = imap_port
         self.imap_password = imap_password
         self.api_key = api_key
+        self.imap_watch = imap_watch
+        self.imap_timeout = imap_timeout
         self.timings = {}
-
+        self.submitted_at = None
+        self.hops = []
+        self.driver = None
+        self.wait = None
+        if registration_method == "browser":
+            self.start_driver()
+
+    def start_driver(self):
         """Start web driver"""
-        chrome_options = webdriver.ChromeOptions()
-        if os.environ.get("SELENIUM_HEADLESS"):
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--disable-gpu")
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(180)
+        self.driver = create_driver()
         self.wait = WebDriverWait(self.driver, 180)
 
+    def quit(self):
+        if self.driver:
+            self.driver.quit()
+
+    def create_worker(self):
+        """
+        A copy of this verifier with its own browser, if it registers
+        through one, for registering accounts concurrently
+        """
+        worker = copy.copy(self)
+        if self.driver:
+            worker.start_driver()
+        return worker
+
     def find_login_button(self):
         with SeleniumCustomWait(self.driver, 0):
             try:
@@ -137,18 +498,61 @@ class RegistrationEmailVerifier(object):
             expected_conditions.presence_of_element_located((By.NAME, "email"))
         )
 
+    def register_new_account_http(self, email, password, public_name):
+        """
+        Register the way Galaxy's registration form does, without a browser.
+        Returns the time.time() and time.perf_counter() at which the form
+        was submitted, taken before the request since Galaxy sends the
+        activation email while handling it.
+        """
+        session = requests.Session()
+        response = session.get(f"{self.server}/login", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        payload = {
+            "email": email,
+            "username": public_name,
+            "password": password,
+            "confirm": password,
+            "subscribe": False,
+        }
+        match = SESSION_CSRF_TOKEN.search(response.text)
+        if match:
+            payload["session_csrf_token"] = match.group(1)
+        submitted = time.time(), time.perf_counter()
+        response = session.post(f"{self.server}/user/create", json=payload, timeout=REQUEST_TIMEOUT)
+        if not response.ok:
+            try:
+                message = response.json().get("err_msg")
+            except ValueError:
+                message = None
+            raise RegistrationError(message or f"{response.status_code} {response.reason}")
+        return submitted
+
     def register_new_account(self):
+        """
+        Returns the time.time() and time.perf_counter() at which the
+        registration was submitted
+        """
+        if not self.driver:
+            return self.register_new_account_http(self.email, self.password, self.username)
         self.toggle_registration_page()
         self.register_new_account_for_user(
             email=self.email, password=self.password, public_name=self.username
         )
+        return time.time(), time.perf_counter()
 
-    def delete_test_account(self):
+    def delete_test_accounts(self, emails, workers=5):
         gi = galaxy.GalaxyInstance(url=self.server, key=self.api_key)
-        user = gi.users.get_users(f_name=self.username)[0]
-        if user["email"] == self.email:
-            gi.users.delete_user(user["id"])
-            gi.users.delete_user(user["id"], purge=True)
+        emails = {email.lower() for email in emails}
+        users = [user for user in find_test_accounts(gi, self.email) if user["email"].lower() in emails]
+        delete_accounts(gi, users, workers)
+
+    def delete_test_account(self):
+        self.delete_test_accounts([self.email], workers=1)
+
+    @property
+    def activation_criteria(self):
+        return f'TO "{self.email}" {ACTIVATION_CRITERIA}'
 
     @tenacity.retry(
         retry=tenacity.retry_if_result(lambda result: not result),
@@ -167,35 +571,257 @@ class RegistrationEmailVerifier(object):
             imap_server.select("inbox")
 
             # Search for messages that match the specified criteria
-            criteria = f'TO "{self.email}" SUBJECT "Galaxy Account Activation"'
-            _, message_ids = imap_server.search(None, criteria)
+            _, message_ids = imap_server.search(None, self.activation_criteria)
             return bool(message_ids[0])
         finally:
             # Close the IMAP connection
             imap_server.close()
             imap_server.logout()
 
-    def run_test_sequence(self):
-        self.load_galaxy_login()
-        self.register_new_account()
-        start = time.time()
+    def create_watcher(self, use_idle=True):
+        return ImapMailWatcher(
+            self.imap_server,
+            self.imap_port,
+            self.imap_username,
+            self.imap_password,
+            use_idle=use_idle,
+        )
+
+    def record_delivery_hops(self, watcher, uid):
+        try:
+            headers, mailbox_time = watcher.fetch_headers(uid)
+        except (imaplib.IMAP4.error, OSError) as e:
+            print(f"Could not fetch the activation email's headers: {e}", file=sys.stderr)
+            return
+        self.hops = delivery_hops(headers, mailbox_time, self.submitted_at)
+
+    def submit_registration(self):
+        """
+        Returns the perf_counter time at which the registration was submitted
+        """
+        self.submitted_at, submitted = self.register_new_account()
+        return submitted
+
+    def poll_for_email(self):
+        start = self.submit_registration()
         verified = self.verify_email_received()
-        elapsed = time.time() - start
+        elapsed = time.perf_counter() - start
+        if verified:
+            # the newest activation email is the one just sent
+            watcher = self.create_watcher()
+            try:
+                watcher.connect()
+                uids = watcher.search(self.activation_criteria)
+                if uids:
+                    self.record_delivery_hops(watcher, max(uids, key=int))
+            except (imaplib.IMAP4.error, OSError) as e:
+                print(f"Could not fetch the activation email's headers: {e}", file=sys.stderr)
+            finally:
+                watcher.close()
+        return verified, elapsed
+
+    def watch_for_email(self):
+        """
+        Log in to IMAP before registering, so that the time until the
+        activation email arrives doesn't include connecting, and any
+        activation emails left over from earlier runs can be ignored
+        """
+        watcher = self.create_watcher(use_idle=self.imap_watch == "idle")
+        watcher.connect()
+        try:
+            self.imap_watch = watcher.method
+            known = watcher.search(self.activation_criteria)
+            start = self.submit_registration()
+            uid, elapsed = watcher.wait_for_message(
+                self.activation_criteria, self.imap_timeout, known, start
+            )
+            if uid is None:
+                return False, time.perf_counter() - start
+            self.record_delivery_hops(watcher, uid)
+            return True, elapsed
+        finally:
+            watcher.close()
+
+    def run_test_sequence(self):
+        if self.driver:
+            self.load_galaxy_login()
+        if self.imap_watch == "poll":
+            verified, elapsed = self.poll_for_email()
+        else:
+            verified, elapsed = self.watch_for_email()
         if self.api_key:
             self.delete_test_account()
         return verified, elapsed
 
+    def format_hop_fields(self):
+        """
+        Line protocol fields for each hop of the email's delivery, and the slowest of them
+        """
+        if not self.hops:
+            return ""
+        fields = [f"hops={len(self.hops)}"]
+        for index, (host, seconds) in enumerate(self.hops, start=1):
+            fields.append(f"hop_{index}={seconds}")
+            fields.append(f"hop_{index}_host={format_string_field(host)}")
+        slowest = max(self.hops, key=lambda hop: hop[1])
+        fields.append(f"slowest_hop={format_string_field(slowest[0])}")
+        return "," + ",".join(fields)
+
     def time_registration_email(self):
         self.timings = {}
+        self.hops = []
         try:
             verified, elapsed = self.run_test_sequence()
             result = "success" if verified else "failure"
             print(
-                f"email_verification,server={self.server},email={self.email},status={result} result={elapsed} {time.time_ns()}"
+                f"email_verification,server={self.server},email={self.email},status={result},watch={self.imap_watch} result={elapsed}{self.format_hop_fields()} {time.time_ns()}"
             )
             print("")
         finally:
-            self.driver.quit()
+            self.quit()
+
+    def register_account(self, registration):
+        if self.driver:
+            # start each registration logged out
+            self.driver.delete_all_cookies()
+            self.load_galaxy_login()
+            self.toggle_registration_page()
+            self.register_new_account_for_user(
+                email=registration.email,
+                password=self.password,
+                public_name=registration.username,
+            )
+            registration.submitted = time.perf_counter()
+        else:
+            _, registration.submitted = self.register_new_account_http(
+                registration.email, self.password, registration.username
+            )
+
+    @staticmethod
+    def register_with_pool(workers, registration):
+        worker = workers.get()
+        try:
+            worker.register_account(registration)
+        except Exception as e:
+            registration.error = " ".join(str(e).split()) or type(e).__name__
+            print(f"Registration of {registration.email} failed: {registration.error}", file=sys.stderr)
+        finally:
+            workers.put(worker)
+
+    def match_activation_emails(self, watcher, known, registrations, futures):
+        """
+        Wait on the shared IMAP connection for activation emails, matching
+        each one to its registration by recipient, until all submitted
+        registrations have their email or imap_timeout has passed since the
+        last was submitted
+        """
+        pending = {registration.email.lower(): registration for registration in registrations}
+        seen = set(known)
+        seen_at = time.perf_counter()
+        while True:
+            for uid in sorted(watcher.search(ACTIVATION_CRITERIA) - seen, key=int):
+                seen.add(uid)
+                headers, _ = watcher.fetch_headers(uid)
+                for _, address in getaddresses(headers.get_all("To") or []):
+                    registration = pending.pop(address.lower(), None)
+                    if registration:
+                        registration.delivered = seen_at
+            submitting = not all(future.done() for future in futures)
+            if not submitting and not any(registration.error is None for registration in pending.values()):
+                return
+            if submitting:
+                timeout = SUBMIT_CHECK_SECONDS
+            else:
+                last_submitted = max(
+                    (registration.submitted for registration in registrations if registration.submitted), default=0
+                )
+                timeout = last_submitted + self.imap_timeout - time.perf_counter()
+                if timeout <= 0:
+                    return
+            seen_at = watcher.wait_for_new_mail(timeout) or time.perf_counter()
+
+    def print_registration_results(self, registrations, start):
+        timestamp = time.time_ns()
+        for registration in registrations:
+            fields = []
+            if registration.submitted:
+                fields.append(f"submitted={registration.submitted - start}")
+            if registration.latency is not None:
+                fields.append(f"result={registration.latency}")
+            if registration.error:
+                fields.append(f"error={format_string_field(registration.error)}")
+            print(
+                f"email_registration_load,server={self.server},email={registration.email},status={registration.status},watch={self.imap_watch} {','.join(fields)} {timestamp}"
+            )
+        submitted = [registration for registration in registrations if registration.status != "failed"]
+        delivered = [registration for registration in submitted if registration.latency is not None]
+        fields = [
+            f"registrations={len(registrations)}",
+            f"submitted={len(submitted)}",
+            f"delivered={len(delivered)}",
+            f"lost={len(submitted) - len(delivered)}",
+            f"failed={len(registrations) - len(submitted)}",
+        ]
+        if submitted:
+            submit_duration = max(registration.submitted for registration in submitted) - start
+            fields.append(f"submit_duration={submit_duration}")
+        if delivered:
+            latencies = [registration.latency for registration in delivered]
+            # from the first submission to the last email arriving
+            delivery_duration = max(registration.delivered for registration in delivered) - min(
+                registration.submitted for registration in submitted
+            )
+            fields += [
+                f"latency_min={min(latencies)}",
+                f"latency_p50={percentile(latencies, 0.5)}",
+                f"latency_p90={percentile(latencies, 0.9)}",
+                f"latency_max={max(latencies)}",
+                f"delivery_duration={delivery_duration}",
+                f"throughput={len(delivered) / delivery_duration if delivery_duration > 0 else 0}",
+            ]
+        print(
+            f"email_registration_load_summary,server={self.server},watch={self.imap_watch} {','.join(fields)} {timestamp}"
+        )
+        print("")
+
+    def time_concurrent_registrations(self, count, workers):
+        """
+        Register count plus addressed accounts at once, using a pool of
+        browsers (or HTTP clients), and time how long each activation email takes to arrive,
+        as a workshop full of people registering at the same time would
+        """
+        tag = self.run_id.hex[:8]
+        registrations = [
+            Registration(plus_address(self.email, f"{tag}-{index}"), f"{self.username}-{tag}-{index}")
+            for index in range(1, count + 1)
+        ]
+        # a persistent connection is needed to match many emails, so poll uses noop instead
+        watcher = self.create_watcher(use_idle=self.imap_watch == "idle")
+        browsers = [self]
+        try:
+            for _ in range(min(workers, count) - 1):
+                browsers.append(self.create_worker())
+            pool = queue.Queue()
+            for browser in browsers:
+                pool.put(browser)
+            watcher.connect()
+            self.imap_watch = watcher.method
+            known = watcher.search(ACTIVATION_CRITERIA)
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(browsers)) as executor:
+                futures = [
+                    executor.submit(self.register_with_pool, pool, registration) for registration in registrations
+                ]
+                self.match_activation_emails(watcher, known, registrations, futures)
+            self.print_registration_results(registrations, start)
+            if self.api_key:
+                self.delete_test_accounts(
+                    [registration.email for registration in registrations if registration.submitted], workers
+                )
+        finally:
+            watcher.close()
+            for browser in browsers:
+                browser.quit()
 
 
 def from_env_or_required(key):
@@ -260,10 +886,99 @@ def create_parser():
         default=os.environ.get("GALAXY_API_KEY"),
         help="Galaxy API key. If specified, the created user will be deleted at the end of the test run",
     )
+    parser.add_argument(
+        "--imap_watch",
+        choices=["idle", "noop", "poll"],
+        default=os.environ.get("IMAP_WATCH") or "idle",
+        help="How to wait for the email. idle and noop keep one IMAP connection open, logged in before registering, "
+        "and are told of new mail by IMAP IDLE (falling back to noop if the server lacks it) or by sending a NOOP "
+        f"every {NOOP_INTERVAL}s. poll reconnects every IMAP_POLL_SECONDS. Defaults to idle (or set IMAP_WATCH env var)",
+    )
+    parser.add_argument(
+        "--imap_timeout",
+        type=float,
+        default=float(os.environ.get("IMAP_TIMEOUT") or 120),
+        help="Seconds to wait for the email with idle or noop. Defaults to 120 (or set IMAP_TIMEOUT env var)",
+    )
+    parser.add_argument(
+        "--registrations",
+        type=int,
+        default=1,
+        help="Number of accounts to register at once, with plus addressed emails made from --email and usernames "
+        "made from --username. Defaults to 1",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=5,
+        help="Number of browsers to register accounts with, when registering more than one. Defaults to 5",
+    )
+    parser.add_argument(
+        "--registration_method",
+        choices=["browser", "http"],
+        default=os.environ.get("REGISTRATION_METHOD") or "browser",
+        help="Register through the registration form in Chrome, or by posting to Galaxy's user creation endpoint "
+        "without a browser. Defaults to browser (or set REGISTRATION_METHOD env var)",
+    )
+    return parser
+
+
+def create_cleanup_parser():
+    parser = argparse.ArgumentParser(
+        prog="registration_email_perf_timer.py cleanup",
+        description="Delete and purge test accounts left behind by earlier runs, i.e. those with the email or a plus "
+        "addressed email made from it.",
+    )
+    parser.add_argument(
+        "-s",
+        "--server",
+        default=os.environ.get("GALAXY_SERVER") or "https://usegalaxy.org.au",
+        help="Galaxy server url",
+    )
+    parser.add_argument(
+        "-e",
+        "--email",
+        **from_env_or_required("GALAXY_EMAIL"),
+        help="Email address the test accounts were registered with (or set GALAXY_EMAIL env var)",
+    )
+    parser.add_argument(
+        "-k",
+        "--api_key",
+        **from_env_or_required("GALAXY_API_KEY"),
+        help="Galaxy admin API key (or set GALAXY_API_KEY env var)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=5,
+        help="Number of accounts to delete at once. Defaults to 5",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="List the accounts that would be deleted, without deleting them",
+    )
     return parser
 
 
+def cleanup(argv):
+    args = create_cleanup_parser().parse_args(argv)
+    gi = galaxy.GalaxyInstance(url=args.server, key=args.api_key)
+    users = find_test_accounts(gi, args.email)
+    for user in users:
+        print(f"{user['email']} {user.get('username', '')}")
+    if args.dry_run or not users:
+        print(f"Found {len(users)} test accounts")
+        return 0
+    start = time.perf_counter()
+    deleted, failed = delete_accounts(gi, users, args.workers)
+    print(f"Deleted {deleted} test accounts in {time.perf_counter() - start:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
 def main():
+    if sys.argv[1:2] == ["cleanup"]:
+        return cleanup(sys.argv[2:])
     parser = create_parser()
     args = parser.parse_args()
 
@@ -277,8 +992,14 @@ def main():
         args.imap_username,
         args.imap_password,
         args.api_key,
+        imap_watch=args.imap_watch,
+        imap_timeout=args.imap_timeout,
+        registration_method=args.registration_method,
     )
-    reg_email_verifier.time_registration_email()
+    if args.registrations > 1:
+        reg_email_verifier.time_concurrent_registrations(args.registrations, args.workers)
+    else:
+        reg_email_verifier.time_registration_email()
     return 0
 
 
@@ -0,0 +1,28 @@
+import registration_email_perf_timer as timer
+
+
+def test_account_pattern_matches_plus_addresses():
+    pattern = timer.test_account_pattern("perf@example.org")
+    assert pattern.match("perf@example.org")
+    assert pattern.match(timer.plus_address("perf@example.org", "abc-1"))
+
+
+def test_account_pattern_skips_other_accounts():
+    pattern = timer.test_account_pattern("perf@example.org")
+    assert not pattern.match("perf-team@example.org")
+    assert not pattern.match("perf+@example.org")
+    assert not pattern.match("perfect@example.org")
+
+
+def test_account_pattern_with_plus_in_base_address():
+    pattern = timer.test_account_pattern("perf+load@example.org")
+    assert pattern.match(timer.plus_address("perf+load@example.org", "abc-1"))
+    assert not pattern.match("perf+load+abc@example.org")
+
+
+def test_registration_delivered_without_submission_is_failed():
+    registration = timer.Registration("perf+abc-1@example.org", "perf-abc-1")
+    registration.delivered = 2.0
+    registration.error = "Read timed out"
+    assert registration.latency is None
+    assert registration.status == "failed"
@@ -0,0 +1,114 @@
+"""
+Encrypted on-disk cache of a logged in browser's cookies, keyed by server and
+username, so that runs which do not measure login can start from the home
+page with a warm session instead of logging in every time.
+
+Cache files are encrypted with Fernet, using a key derived from the
+SESSION_CACHE_KEY env var if set, or else from the user's password.
+"""
+import base64
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import requests
+
+import galaxy_api
+
+KDF_ITERATIONS = 200000
+
+
+def derive_key(server, username, secret):
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=f"{server}|{username}".encode("utf-8"),
+        iterations=KDF_ITERATIONS,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode("utf-8")))
+
+
+class SessionCache(object):
+    """
+    Example usage:
+
+    cache = SessionCache(cache_dir, server, username, password)
+    cookies = cache.load()
+    if cookies is None:
+        ... log in ...
+        cache.save(driver.get_cookies())
+    """
+
+    def __init__(self, cache_dir, server, username, password, ttl=43200):
+        self.cache_dir = cache_dir
+        self.server = server
+        self.username = username
+        self.ttl = ttl
+        # any passphrase will do, as the key is derived from it rather than used as is
+        self.fernet = Fernet(derive_key(server, username, os.environ.get("SESSION_CACHE_KEY") or password))
+        self.domain = urlparse(server).hostname
+
+    @property
+    def path(self):
+        name = hashlib.sha256(f"{self.server}|{self.username}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.session")
+
+    def load(self):
+        """
+        Return the cached cookies, or None if there are none, they are
+        older than the ttl, or any of them has expired.
+        """
+        try:
+            with open(self.path, "rb") as cache_file:
+                data = json.loads(self.fernet.decrypt(cache_file.read(), ttl=self.ttl))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError):
+            # expired, or encrypted with a different key
+            self.clear()
+            return None
+        cookies = data["cookies"]
+        now = time.time()
+        if not cookies or any(cookie.get("expiry") and cookie["expiry"] <= now for cookie in cookies):
+            self.clear()
+            return None
+        return cookies
+
+    def save(self, cookies):
+        """
+        Save the cookies for the Galaxy server's own domain
+        """
+        cookies = [cookie for cookie in cookies if self.domain.endswith(cookie.get("domain", "").lstrip("."))]
+        token = self.fernet.encrypt(
+            json.dumps({"server": self.server, "username": self.username, "cookies": cookies}).encode("utf-8")
+        )
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as cache_file:
+            cache_file.write(token)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def is_logged_in(self, cookies):
+        """
+        Check with the server that the cookies still belong to a logged in user
+        """
+        session = galaxy_api.create_session(
+            cookies={cookie["name"]: cookie["value"] for cookie in cookies}, pool_size=1
+        )
+        try:
+            user = galaxy_api.get_json(session, f"{self.server}/api/users/current")
+        except (requests.RequestException, ValueError):
+            return False
+        # anonymous users have no id
+        return bool(user.get("id"))
@@ -0,0 +1,46 @@
+"""
+Galaxy servers to run the user flow against. Each target is a copy of the
+command line options with its own server, credentials and workflow, so that
+several servers can be sampled at the same moment by one process.
+
+Targets are made from each --server given, sharing the same credentials, or
+read from a JSON targets file. Keys missing from an entry in the file fall
+back to the command line options, and passwords can be read from env vars
+instead of being written to the file, e.g.
+
+[
+    {"server": "https://usegalaxy.org.au", "username": "perf@example.org", "password_env": "GALAXY_AU_PASSWORD"},
+    {"server": "https://dev.gvl.org.au", "workflow_name": "Selenium_test_4"}
+]
+"""
+import copy
+import json
+import os
+
+TARGET_KEYS = ("server", "username", "password", "workflow_name", "category", "end_step")
+
+
+def load_targets(args):
+    if args.targets:
+        with open(args.targets, encoding="utf-8") as targets_file:
+            entries = json.load(targets_file)
+    else:
+        entries = [{"server": server} for server in args.server]
+    targets = []
+    for entry in entries:
+        if not entry.get("server"):
+            raise ValueError(f"Target has no server: {entry}")
+        target = copy.copy(args)
+        for key in TARGET_KEYS:
+            if key in entry:
+                setattr(target, key, entry[key])
+        for key in ("username", "password"):
+            env_key = entry.get(f"{key}_env")
+            if env_key:
+                if not os.environ.get(env_key):
+                    raise ValueError(f"{env_key} is not set, for {target.server}")
+                setattr(target, key, os.environ[env_key])
+        if not target.username or not target.password:
+            raise ValueError(f"No username or password for {target.server}")
+        targets.append(target)
+    return targets
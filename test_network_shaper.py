@@ -0,0 +1,99 @@
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from network_shaper import NetworkShaper, ShapingProfile
+
+# allowance for scheduling and the loopback itself, on top of the emulated delays
+SLACK = 0.15
+
+
+class EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            self.request.sendall(data)
+        self.request.shutdown(socket.SHUT_WR)
+
+
+class EchoServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+@pytest.fixture
+def echo_address():
+    server = EchoServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def shaped(profile):
+    shaper = NetworkShaper(profile)
+    shaper.start()
+    return shaper
+
+
+def open_tunnel(shaper, address):
+    """
+    Connect to the echo server through a CONNECT tunnel, as the browser does for HTTPS
+    """
+    sock = socket.create_connection(shaper.address)
+    sock.sendall(f"CONNECT {address[0]}:{address[1]} HTTP/1.1\r\n\r\n".encode("latin-1"))
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(1024)
+    assert response.startswith(b"HTTP/1.1 200")
+    return sock
+
+
+def echo(sock, payload):
+    sock.sendall(payload)
+    sock.shutdown(socket.SHUT_WR)
+    received = b""
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return received
+        received += data
+
+
+def test_round_trips_are_delayed_by_rtt(echo_address):
+    shaper = shaped(ShapingProfile("test", rtt=0.2))
+    try:
+        start = time.perf_counter()
+        sock = open_tunnel(shaper, echo_address)
+        connected = time.perf_counter()
+        assert echo(sock, b"ping") == b"ping"
+        echoed = time.perf_counter()
+        sock.close()
+    finally:
+        shaper.stop()
+    # one round trip for the TCP handshake, and one for the echo
+    assert 0.2 <= connected - start < 0.2 + SLACK
+    assert 0.2 <= echoed - connected < 0.2 + SLACK
+
+
+@pytest.mark.parametrize("direction", ["up_kbps", "down_kbps"])
+def test_transfers_are_capped_to_bandwidth(echo_address, direction):
+    # 50 kB at 800 kbit/s takes half a second, in whichever direction is capped
+    shaper = shaped(ShapingProfile("test", rtt=0.05, **{direction: 800}))
+    payload = bytes(range(256)) * 200
+    try:
+        sock = open_tunnel(shaper, echo_address)
+        start = time.perf_counter()
+        assert echo(sock, payload) == payload
+        elapsed = time.perf_counter() - start
+        sock.close()
+    finally:
+        shaper.stop()
+    expected = 0.05 + len(payload) * 8 / 800000
+    assert expected <= elapsed < expected + SLACK
@@ -0,0 +1,134 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from output_sinks import InfluxSink
+
+LINES = [f"user_flow_performance,action=step_{index} time_taken={index}.0 {index}" for index in range(5)]
+
+
+class StubInflux(object):
+    """
+    A local InfluxDB write endpoint, that answers each write with the next
+    of its statuses, or 204 once they run out
+    """
+
+    def __init__(self):
+        self.statuses = []
+        self.writes = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                url = urlparse(self.path)
+                stub.writes.append(
+                    {
+                        "path": url.path,
+                        "params": parse_qs(url.query),
+                        "headers": self.headers,
+                        "lines": gzip.decompress(body).decode("utf-8").split("\n"),
+                    }
+                )
+                self.send_response(stub.statuses.pop(0) if stub.statuses else 204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def lines(self):
+        return [line for write in self.writes for line in write["lines"]]
+
+
+@pytest.fixture
+def influx():
+    stub = StubInflux()
+    yield stub
+    stub.stop()
+
+
+def create_sink(influx, tmp_path, **kwargs):
+    # a long flush interval, so that points are only sent by flush, close or a full batch
+    return InfluxSink(
+        influx.url, bucket="galaxy", org="galaxy-au", token="secret", flush_interval=60,
+        spool_path=str(tmp_path / "spool.lp"), **kwargs,
+    )
+
+
+def test_points_are_sent_gzipped_in_batches(influx, tmp_path):
+    sink = create_sink(influx, tmp_path, batch_size=2)
+    sink.write(LINES)
+    sink.close()
+    assert [write["lines"] for write in influx.writes] == [LINES[0:2], LINES[2:4], LINES[4:5]]
+    write = influx.writes[0]
+    assert write["path"] == "/api/v2/write"
+    assert write["params"] == {"bucket": ["galaxy"], "org": ["galaxy-au"], "precision": ["ns"]}
+    assert write["headers"]["Content-Encoding"] == "gzip"
+    assert write["headers"]["Authorization"] == "Token secret"
+
+
+def test_influxdb_1_writes_to_the_database(influx, tmp_path):
+    sink = InfluxSink(influx.url, database="galaxy", flush_interval=60, spool_path=str(tmp_path / "spool.lp"))
+    sink.write(LINES[:1])
+    sink.close()
+    assert influx.writes[0]["path"] == "/write"
+    assert influx.writes[0]["params"] == {"db": ["galaxy"], "precision": ["ns"]}
+
+
+@pytest.mark.parametrize("status", [300, 429, 500, 503])
+def test_undelivered_points_are_spooled(influx, tmp_path, status):
+    influx.statuses = [status]
+    sink = create_sink(influx, tmp_path)
+    sink.write(LINES)
+    sink.flush()
+    assert (tmp_path / "spool.lp").read_text().splitlines() == LINES
+    sink.close()
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 413])
+def test_rejected_points_are_not_spooled(influx, tmp_path, status):
+    influx.statuses = [status]
+    sink = create_sink(influx, tmp_path)
+    sink.write(LINES)
+    sink.close()
+    assert len(influx.writes) == 1
+    assert not (tmp_path / "spool.lp").exists()
+
+
+def test_spool_is_replayed_before_new_points(influx, tmp_path):
+    influx.statuses = [503]
+    sink = create_sink(influx, tmp_path, batch_size=2)
+    sink.write(LINES[:3])
+    sink.flush()
+    sink.write(LINES[3:])
+    sink.close()
+    # the failed first batch, then the spool in batches, then the new points
+    assert [write["lines"] for write in influx.writes] == [LINES[0:2], LINES[0:2], LINES[2:3], LINES[3:5]]
+    assert not (tmp_path / "spool.lp").exists()
+
+
+def test_spool_keeps_points_not_yet_replayed(influx, tmp_path):
+    (tmp_path / "spool.lp").write_text("".join(f"{line}\n" for line in LINES[:4]))
+    # the first spooled batch is delivered, the second is not, nor are the new points
+    influx.statuses = [204, 500]
+    sink = create_sink(influx, tmp_path, batch_size=2)
+    sink.write(LINES[4:])
+    sink.flush()
+    assert (tmp_path / "spool.lp").read_text().splitlines() == LINES[2:5]
+    sink.close()
+    assert influx.lines[-3:] == LINES[2:5]
+    assert not (tmp_path / "spool.lp").exists()
@@ -0,0 +1,144 @@
+"""
+Monotonic, hierarchical timing of user flow steps.
+
+Each clocked step is recorded as a span, which can contain nested child
+spans for the phases of the step. Durations are measured with
+time.perf_counter_ns, and wall clock timestamps are derived from a single
+time.time_ns reading taken when the span starts, so that they stay
+consistent with the measured duration.
+"""
+import contextlib
+import functools
+import time
+
+
+class EndStepReached(Exception):
+    """
+    Raised when a specific action step has been reached
+    """
+
+    pass
+
+
+class Span(object):
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.children = []
+        # extra fields for the span's own point
+        self.fields = {}
+        # extra tags for all points of a top level span
+        self.tags = {}
+        # extra points to report alongside the span, as (measurement, tags, fields)
+        self.records = []
+        self.failed = False
+        self.start_ns = None
+        self.end_ns = None
+        # unix time
+        self.start_timestamp = None
+
+    def start(self):
+        self.start_timestamp = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+
+    def end(self):
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def elapsed(self):
+        """Duration in seconds"""
+        return (self.end_ns - self.start_ns) / 1e9
+
+    @property
+    def end_timestamp(self):
+        return self.start_timestamp + (self.end_ns - self.start_ns)
+
+    @property
+    def path(self):
+        if self.parent:
+            return f"{self.parent.path}/{self.name}"
+        return self.name
+
+    @property
+    def root(self):
+        return self.parent.root if self.parent else self
+
+    @property
+    def depth(self):
+        return self.parent.depth + 1 if self.parent else 0
+
+    def add_record(self, measurement, fields, **tags):
+        self.records.append((measurement, tags, fields))
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class SpanTimer(object):
+    """
+    Example usage:
+
+    with timer.span("upload_file"):
+        with timer.span("wait_running"):
+            ...
+    """
+
+    def __init__(self):
+        self.roots = []
+        self.stack = []
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        parent = self.stack[-1] if self.stack else None
+        span = Span(name, parent, **attributes)
+        (parent.children if parent else self.roots).append(span)
+        self.stack.append(span)
+        span.start()
+        try:
+            yield span
+        except EndStepReached:
+            raise
+        except BaseException:
+            span.failed = True
+            raise
+        finally:
+            span.end()
+            self.stack.pop()
+
+    def add(self, span):
+        """Add an already completed span as a top level step"""
+        self.roots.append(span)
+
+    def walk(self):
+        for root in self.roots:
+            yield from root.walk()
+
+
+def clock_action(action_name):
+    """
+    Decorator to measure time taken to perform
+    a function. The timing is stored as a span in the
+    wrapped object, assumed to be first args to wrapped
+    function. The object's before_step and after_step
+    hooks are called outside of the timed section.
+    :return:
+    """
+
+    def wrap(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            obj = args[0]
+            obj.before_step(action_name)
+            with obj.spans.span(action_name) as span:
+                retval = func(*args, **kwargs)
+            obj.after_step(span)
+            if obj.end_step == action_name:
+                raise EndStepReached(action_name)
+            return retval
+
+        return wrapper
+
+    return wrap
@@ -0,0 +1,109 @@
+"""
+Tool search latency sweep. A file of queries, each with the id of a tool it
+is expected to find, is run back to back in one session, both through the
+tool panel search box and directly against the tool search API, to sample
+how search latency varies with query length, match count and index warmth.
+
+The query file has one query per line, with the expected tool id (or a
+prefix of it) after a tab. Blank lines and lines starting with # are
+ignored, e.g.
+
+bwa	toolshed.g2.bx.psu.edu/repos/devteam/bwa/bwa/
+fastqc	toolshed.g2.bx.psu.edu/repos/devteam/fastqc/fastqc/
+"""
+import time
+
+import galaxy_api
+from latency_histogram import LatencyHistogram
+
+CHANNELS = ("ui", "api")
+
+
+class ToolQuery(object):
+    def __init__(self, query, expected_tool_id):
+        self.query = query
+        self.expected_tool_id = expected_tool_id
+
+    def rank(self, tool_ids):
+        """1 based position of the expected tool in search results, or None"""
+        for index, tool_id in enumerate(tool_ids, start=1):
+            if tool_id.startswith(self.expected_tool_id):
+                return index
+        return None
+
+
+def read_tool_queries(path):
+    queries = []
+    with open(path, encoding="utf-8") as query_file:
+        for line_number, line in enumerate(query_file, start=1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.split("\t")
+            if len(parts) != 2 or not parts[0] or not parts[1]:
+                raise ValueError(f"{path}:{line_number}: expected a query and a tool id separated by a tab")
+            queries.append(ToolQuery(parts[0], parts[1].strip()))
+    if not queries:
+        raise ValueError(f"No queries found in {path}")
+    return queries
+
+
+def search_tools_api(session, server, query):
+    """
+    Search for tools through the API. Returns the time taken and the tool ids found.
+    """
+    start = time.perf_counter()
+    tool_ids = galaxy_api.get_json(session, f"{server}/api/tools", q=query)
+    return time.perf_counter() - start, tool_ids
+
+
+class SweepResults(object):
+    """
+    Collects per query latencies for each channel, and formats them as
+    span records: one tool_search_query point per sample, and
+    tool_search_summary points with the distribution of each query (when
+    it was run more than once) and of all queries together.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.records = []
+        # (channel, query) pairs already sent, to tell cold from warm searches
+        self.seen = set()
+        # records share the sweep's timestamp, so the iteration tells repeats apart
+        self.iteration = 0
+
+    def add(self, channel, tool_query, time_taken, found, rank=None, result_count=None):
+        warm = any((other, tool_query.query) in self.seen for other in CHANNELS)
+        self.seen.add((channel, tool_query.query))
+        self.records.append(
+            (
+                "tool_search_query",
+                {"channel": channel, "query": tool_query.query, "iteration": self.iteration},
+                {
+                    "time_taken": time_taken,
+                    "found": found,
+                    "rank": rank,
+                    "result_count": result_count,
+                    "query_length": len(tool_query.query),
+                    "warm": warm,
+                },
+            )
+        )
+        if found:
+            for query in (tool_query.query, None):
+                self.histograms.setdefault((channel, query), LatencyHistogram()).record(time_taken)
+
+    def summary_records(self):
+        records = []
+        for (channel, query), histogram in self.histograms.items():
+            if query is not None and histogram.count < 2:
+                continue
+            records.append(
+                (
+                    "tool_search_summary",
+                    {"channel": channel, "query": query if query is not None else "all"},
+                    histogram.summary_fields(),
+                )
+            )
+        return records
@@ -0,0 +1,245 @@
+"""
+Upload engine for Galaxy's resumable (TUS) upload API, sending a file of
+any size generated on the fly from a seeded random stream, so that nothing
+has to be stored locally or held in memory beyond the chunks in flight.
+
+When the server supports the TUS concatenation extension, the file is split
+into parts that are uploaded in parallel and then joined. Otherwise its
+chunks are sent one after another over a single upload.
+"""
+import base64
+import concurrent.futures
+import random
+import sys
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+
+import galaxy_api
+from invocation_monitor import JobStateTracker
+from latency_histogram import LatencyHistogram
+
+TUS_VERSION = "1.0.0"
+UPLOAD_PATH = "/api/upload/resumable_upload/"
+BLOCK_SIZE = 1024 * 1024
+
+
+class SeededData(object):
+    """
+    Pseudo random bytes made from a seed, in blocks that can each be
+    generated on their own, so that any range can be read (or read again on
+    a retry) in any order
+    """
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seed = seed
+
+    def block(self, index):
+        return random.Random(f"{self.seed}-{index}").randbytes(BLOCK_SIZE)
+
+    def read(self, offset, length):
+        length = min(length, self.size - offset)
+        parts = []
+        while length > 0:
+            index, start = divmod(offset, BLOCK_SIZE)
+            part = self.block(index)[start:start + length]
+            parts.append(part)
+            offset += len(part)
+            length -= len(part)
+        return b"".join(parts)
+
+
+class UploadResult(object):
+    def __init__(self, session_id, total_bytes, chunk_size, parallelism, elapsed, generate_time, chunk_latencies, retries):
+        self.session_id = session_id
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.elapsed = elapsed
+        # time spent generating data, which is included in elapsed but not in chunk latencies
+        self.generate_time = generate_time
+        self.chunk_latencies = chunk_latencies
+        self.retries = retries
+
+    def fields(self):
+        fields = {
+            "bytes": self.total_bytes,
+            "chunk_size": self.chunk_size,
+            "parallelism": self.parallelism,
+            "mb_per_sec": self.total_bytes / self.elapsed / 1e6 if self.elapsed > 0 else None,
+            "generate_seconds": self.generate_time,
+            "retries": self.retries,
+        }
+        for name, value in self.chunk_latencies.summary_fields().items():
+            fields[f"chunk_{name}"] = value
+        return fields
+
+
+class TusUploader(object):
+    """
+    Example usage:
+
+    data = SeededData(100 * 1024 * 1024, seed=1)
+    result = TusUploader(session, server, data, chunk_size=10 * 1024 * 1024, parallelism=4).upload()
+    fetch_payload(history_id, result.session_id, "upload.dat")
+    """
+
+    def __init__(self, session, server, data, chunk_size, parallelism=1, name="upload.dat", max_retries=5):
+        self.session = session
+        self.upload_url = f"{server}{UPLOAD_PATH}"
+        self.data = data
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.name = name
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.chunk_latencies = LatencyHistogram()
+        self.generate_time = 0.0
+        self.retries = 0
+
+    def request(self, method, url, headers=None, **kwargs):
+        response = self.session.request(
+            method,
+            url,
+            headers=dict({"Tus-Resumable": TUS_VERSION}, **(headers or {})),
+            timeout=galaxy_api.REQUEST_TIMEOUT,
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response
+
+    def supports_concatenation(self):
+        try:
+            response = self.request("OPTIONS", self.upload_url)
+        except requests.RequestException:
+            return False
+        extensions = response.headers.get("Tus-Extension", "")
+        return "concatenation" in [extension.strip() for extension in extensions.split(",")]
+
+    def create(self, length, partial=False):
+        """
+        Create an upload, and return its url
+        """
+        headers = {
+            "Upload-Length": str(length),
+            "Upload-Metadata": f"filename {base64.b64encode(self.name.encode('utf-8')).decode('ascii')}",
+        }
+        if partial:
+            headers["Upload-Concat"] = "partial"
+        response = self.request("POST", self.upload_url, headers=headers)
+        return urljoin(self.upload_url, response.headers["Location"])
+
+    def concatenate(self, urls):
+        response = self.request("POST", self.upload_url, headers={"Upload-Concat": f"final;{' '.join(urls)}"})
+        return urljoin(self.upload_url, response.headers["Location"])
+
+    def server_offset(self, url):
+        return int(self.request("HEAD", url).headers["Upload-Offset"])
+
+    def send(self, url, start, length):
+        """
+        Send length bytes of data from start to the upload at url, a chunk
+        at a time, resuming from the server's offset after a failed chunk
+        """
+        offset = 0
+        attempt = 0
+        while offset < length:
+            generate_start = time.perf_counter()
+            chunk = self.data.read(start + offset, min(self.chunk_size, length - offset))
+            chunk_start = time.perf_counter()
+            try:
+                response = self.request(
+                    "PATCH",
+                    url,
+                    headers={"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+                    data=chunk,
+                )
+            except requests.RequestException as e:
+                attempt += 1
+                print(f"Chunk at {start + offset} failed, attempt {attempt}: {e}", file=sys.stderr)
+                if attempt >= self.max_retries:
+                    raise TimeoutError("Max number of attempts exceeded")
+                with self.lock:
+                    self.retries += 1
+                # Exponential backoff before resuming
+                time.sleep(2 ** attempt)
+                offset = self.server_offset(url)
+                continue
+            end = time.perf_counter()
+            attempt = 0
+            offset = int(response.headers.get("Upload-Offset", offset + len(chunk)))
+            with self.lock:
+                self.generate_time += chunk_start - generate_start
+                self.chunk_latencies.record(end - chunk_start)
+
+    def upload(self):
+        start = time.perf_counter()
+        size = self.data.size
+        parallelism = 1
+        if self.parallelism > 1 and size > self.chunk_size and self.supports_concatenation():
+            parallelism = self.parallelism
+        if parallelism == 1:
+            url = self.create(size)
+            self.send(url, 0, size)
+        else:
+            # whole chunks per part, so that every chunk but the last is full size
+            chunks = -(-size // self.chunk_size)
+            part_size = -(-chunks // parallelism) * self.chunk_size
+            parts = [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+            urls = [self.create(length, partial=True) for _, length in parts]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(parts)) as executor:
+                futures = [
+                    executor.submit(self.send, url, offset, length) for url, (offset, length) in zip(urls, parts)
+                ]
+                for future in futures:
+                    future.result()
+            url = self.concatenate(urls)
+        return UploadResult(
+            session_id=url.rstrip("/").rsplit("/", 1)[-1],
+            total_bytes=size,
+            chunk_size=self.chunk_size,
+            parallelism=parallelism,
+            elapsed=time.perf_counter() - start,
+            generate_time=self.generate_time,
+            chunk_latencies=self.chunk_latencies,
+            retries=self.retries,
+        )
+
+
+def fetch_payload(history_id, session_id, name):
+    """
+    The /api/tools/fetch request the upload dialog makes for an uploaded file
+    """
+    return {
+        "history_id": history_id,
+        "targets": [
+            {
+                "destination": {"type": "hdas"},
+                "elements": [{"src": "files", "name": name, "ext": "auto", "dbkey": "?"}],
+            }
+        ],
+        "files_0|file_data": {"session_id": session_id, "name": name},
+    }
+
+
+def wait_for_upload_job(session, server, fetch_response, timeout, interval=1):
+    """
+    Poll the upload's job until it finishes. Returns the job's JobRecord,
+    and the state of the dataset it made.
+    """
+    job_id = fetch_response["jobs"][0]["id"]
+    dataset_id = fetch_response["outputs"][0]["id"]
+    tracker = JobStateTracker(session, server)
+    deadline = time.monotonic() + timeout
+    while True:
+        tracker.observe([galaxy_api.get_json(session, f"{server}/api/jobs/{job_id}")])
+        if tracker.all_finished:
+            break
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"Upload job {job_id} did not finish within {timeout}s")
+        time.sleep(interval)
+    dataset = galaxy_api.get_json(session, f"{server}/api/datasets/{dataset_id}")
+    return tracker.jobs[job_id], dataset